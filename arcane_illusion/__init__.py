@@ -1,21 +1,29 @@
-from krita import DockWidgetFactoryBase, DockWidgetFactory
-from .extension import ArcaneIllusion
-from .image_generation import ImageGeneration
-from .segmentation_palette import SegmentationPalette
+from .startup import timed
 
-krita = Krita.instance()
-krita.addExtension(ArcaneIllusion(parent=krita))
-krita.addDockWidgetFactory(
-    DockWidgetFactory(
-        ImageGeneration.id,
-        DockWidgetFactoryBase.DockLeft,
-        ImageGeneration,
-    )
-)
-krita.addDockWidgetFactory(
-    DockWidgetFactory(
-        SegmentationPalette.id,
-        DockWidgetFactoryBase.DockRight,
-        SegmentationPalette,
-    )
-)
+try:
+    from krita import DockWidgetFactoryBase, DockWidgetFactory, Krita
+except ImportError:  # Imported outside of Krita, e.g. by the benchmarks
+    Krita = None
+
+if Krita:
+    # Only the extension and docker stubs load here, the dockers import their modules when first shown
+    with timed("plugin registration"):
+        from .extension import ArcaneIllusion
+        from .dockers import ImageGeneration, SegmentationPalette
+
+        krita = Krita.instance()
+        krita.addExtension(ArcaneIllusion(parent=krita))
+        krita.addDockWidgetFactory(
+            DockWidgetFactory(
+                ImageGeneration.id,
+                DockWidgetFactoryBase.DockLeft,
+                ImageGeneration,
+            )
+        )
+        krita.addDockWidgetFactory(
+            DockWidgetFactory(
+                SegmentationPalette.id,
+                DockWidgetFactoryBase.DockRight,
+                SegmentationPalette,
+            )
+        )
@@ -0,0 +1,41 @@
+import importlib
+from typing import ClassVar
+
+from krita import DockWidget
+
+from .startup import timed
+
+
+class _LazyDocker(DockWidget):
+    """Docker registered at startup that only imports and builds its content the first time it is shown"""
+    id: ClassVar[str]
+    title: ClassVar[str]
+    content: ClassVar[str]
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle(self.title)
+
+    def showEvent(self, event):
+        if self.widget() is None:
+            with timed(f"{self.id} first show"):
+                module_name, name = self.content.split(":")
+                self.setWidget(getattr(importlib.import_module(module_name, __package__), name)())
+        super().showEvent(event)
+
+    def canvasChanged(self, canvas):
+        widget = self.widget()
+        if widget is not None and hasattr(widget, "canvas_changed"):
+            widget.canvas_changed(canvas)
+
+
+class ImageGeneration(_LazyDocker):
+    id: ClassVar[str] = "image_generation"
+    title: ClassVar[str] = "AI - Image Generation"
+    content: ClassVar[str] = ".image_generation:ImageGenerationWidget"
+
+
+class SegmentationPalette(_LazyDocker):
+    id: ClassVar[str] = "segmentation_palette"
+    title: ClassVar[str] = "AI - Segmentation Palette"
+    content: ClassVar[str] = ".segmentation_palette:SegmentationPaletteWidget"
@@ -4,6 +4,7 @@ from PyQt5.QtWidgets import QMenu, QWidget, QMessageBox
 from krita import Krita, Extension, DockWidget
 
 from .constants import EXTENSION_ID, EXTENSION_NAME, EXTENSION_VERSION
+from .startup import report
 
 
 class ArcaneIllusion(Extension):
@@ -35,4 +36,6 @@ class ArcaneIllusion(Extension):
         Python version: {'.'.join(map(str, sys.version_info))}
         Krita version: {Application.version()}
         """
-        QMessageBox.information(QWidget(), f"About {EXTENSION_NAME}", text)
+        box = QMessageBox(QMessageBox.Information, f"About {EXTENSION_NAME}", text, parent=QWidget())
+        box.setDetailedText(f"Startup timings\n{report()}")
+        box.exec_()
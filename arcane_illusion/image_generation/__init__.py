@@ -1,2 +1,9 @@
 """Image Generation"""
-from .image_generation import ImageGeneration
+
+
+def __getattr__(name):
+    # The widget needs Krita, importing it lazily keeps the client usable on its own
+    if name == "ImageGenerationWidget":
+        from .image_generation import ImageGenerationWidget
+        return ImageGenerationWidget
+    raise AttributeError(name)
@@ -0,0 +1,255 @@
+import asyncio
+import concurrent.futures
+import io
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Awaitable, Dict, List, Optional, Tuple, TypeVar
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+from arcane_illusion.tracing import span
+from .cancellation import CancellationToken, Cancelled
+from .connection_pool import STALE_ERRORS, Key, Timeout, split_url
+
+T = TypeVar("T")
+
+# What a stale connection raises here besides the errors of a stale pooled socket
+_STALE_ERRORS = STALE_ERRORS + (asyncio.IncompleteReadError,)
+
+
+@dataclass()
+class AsyncResponse:
+    status: int
+    reason: str
+    headers: Dict[str, str]
+    body: bytes
+    will_close: bool
+
+
+@dataclass()
+class _Connection:
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    last_used: float = 0.0
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncTransport:
+    """HTTP/1.1 keep-alive client running every request on a single background asyncio event loop thread.
+
+    Requests started with `run`, the health checks and option lists, or with `submit`, the interrupts, cost a
+    coroutine each rather than a blocked thread. `call` holds the calling thread until the coroutine is done, which
+    the progress poller uses to poll every busy backend at once. Generations stay on `ConnectionPool` worker threads,
+    as their responses are streamed. Connections are pooled per host like `ConnectionPool`, and the read timeout bounds
+    the time taken by the whole response.
+    """
+
+    def __init__(self, max_per_host: int = 8, idle_timeout: float = 30.0, timeout: Timeout = (10.0, 600.0)) -> None:
+        super().__init__()
+        self._max_per_host = max_per_host
+        self._idle_timeout = idle_timeout
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Only touched from the event loop thread
+        self._idle: Dict[Key, List[_Connection]] = {}
+        self._slots: Dict[Key, asyncio.Semaphore] = {}
+
+    def submit(self, coroutine: Awaitable[T]) -> "concurrent.futures.Future[T]":
+        return asyncio.run_coroutine_threadsafe(coroutine, self._event_loop())
+
+    def call(self, coroutine: Awaitable[T], token: CancellationToken = None) -> T:
+        """Runs the coroutine on the event loop and waits for its result, cancelling it with the token"""
+        future = self.submit(coroutine)
+        remove = token.on_cancel(future.cancel) if token else None
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            raise Cancelled()
+        finally:
+            if remove:
+                remove()
+
+    def run(self, coroutine: Awaitable[T], signals):
+        """Runs the coroutine on the event loop, its result or exception is emitted by the `Signals` given.
+
+        Only a weak reference to the signals is kept, the caller owns them until delivery so that they are never
+        destroyed on the event loop thread.
+        """
+        signals = weakref.proxy(signals)
+
+        def done(future: concurrent.futures.Future):
+            try:
+                if future.cancelled():
+                    signals.error.emit(Cancelled())
+                elif future.exception() is not None:
+                    error = future.exception()
+                    signals.error.emit(error if isinstance(error, Exception) else Exception(repr(error)))
+                else:
+                    signals.finished.emit(future.result())
+            except ReferenceError:
+                # The caller went away before the outcome arrived
+                pass
+
+        self.submit(coroutine).add_done_callback(done)
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop:
+            loop.call_soon_threadsafe(self._close_idle)
+            loop.call_soon_threadsafe(loop.stop)
+
+    async def request(self, url, method=None, data=None, headers=None, timeout: Timeout = None) -> AsyncResponse:
+        """Sends a request and returns the whole response, raising `HTTPError` on non 2xx statuses"""
+        parts = urlsplit(url)
+        key, target = split_url(url)
+        method = method or ("POST" if data is not None else "GET")
+        connect_timeout, read_timeout = timeout or self._timeout
+        head = self._head(method, target, parts.netloc, data, headers or {})
+
+        try:
+            response = await self._send(key, method, target, parts, head, data, connect_timeout, read_timeout)
+        except asyncio.TimeoutError as e:
+            # Before Python 3.11 the asyncio timeout is not an OSError, callers expect the socket one
+            raise TimeoutError(f"{method} {url} timed out") from e
+        if not 200 <= response.status < 300:
+            raise HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(response.body))
+        return response
+
+    async def _send(self, key, method, target, parts, head, data, connect_timeout, read_timeout) -> AsyncResponse:
+        async with self._slot(key):
+            with span("http.round_trip", method=method, path=parts.path):
+                connection, reused = await self._checkout(key, connect_timeout)
+                try:
+                    response = await asyncio.wait_for(self._exchange(connection, head, data, method), read_timeout)
+                except _STALE_ERRORS:
+                    connection.close()
+                    if not reused:
+                        raise
+                    connection = await self._connect(key, connect_timeout)
+                    response = await self._retry(connection, head, data, method, read_timeout)
+                except BaseException:
+                    connection.close()
+                    raise
+            self._release(key, connection, response)
+        return response
+
+    async def _retry(self, connection: _Connection, head: bytes, data, method: str, read_timeout: float):
+        try:
+            return await asyncio.wait_for(self._exchange(connection, head, data, method), read_timeout)
+        except BaseException:
+            connection.close()
+            raise
+
+    @staticmethod
+    def _head(method: str, target: str, host: str, data, headers: dict) -> bytes:
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {host}", "Connection: keep-alive"]
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            lines.append(f"Content-Length: {len(data)}")
+        elif data is not None:
+            lines.append("Transfer-Encoding: chunked")
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    @staticmethod
+    async def _exchange(connection: _Connection, head: bytes, data, method: str) -> AsyncResponse:
+        reader, writer = connection.reader, connection.writer
+        writer.write(head)
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            writer.write(data)
+        elif data is not None:
+            # Iterables, e.g. a `RequestBody`, are sent with chunked encoding as they are produced. Producing a chunk
+            # may mean encoding or compressing an image, so it happens on an executor thread rather than the loop.
+            loop = asyncio.get_running_loop()
+            chunks = iter(data)
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    writer.write(b"%x\r\n" % len(chunk))
+                    writer.write(chunk)
+                    writer.write(b"\r\n")
+                    await writer.drain()
+            writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by the server")
+        version, status, *reason = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        will_close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+        if method == "HEAD" or status in ("204", "304"):
+            body = b""
+        elif "chunked" in headers.get("transfer-encoding", "").lower():
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            will_close = True
+        return AsyncResponse(int(status), reason[0] if reason else "", headers, body, will_close)
+
+    def _slot(self, key) -> asyncio.Semaphore:
+        if key not in self._slots:
+            self._slots[key] = asyncio.Semaphore(self._max_per_host)
+        return self._slots[key]
+
+    async def _checkout(self, key, connect_timeout: float) -> Tuple[_Connection, bool]:
+        now = time.monotonic()
+        idle = self._idle.get(key)
+        while idle:
+            connection = idle.pop()
+            if now - connection.last_used <= self._idle_timeout and not connection.reader.at_eof():
+                return connection, True
+            connection.close()
+        return await self._connect(key, connect_timeout), False
+
+    @staticmethod
+    async def _connect(key, connect_timeout: float) -> _Connection:
+        scheme, host, port = key
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=scheme == "https" or None), connect_timeout)
+        return _Connection(reader, writer)
+
+    def _release(self, key, connection: _Connection, response: AsyncResponse):
+        if response.will_close:
+            connection.close()
+            return
+        connection.last_used = time.monotonic()
+        self._idle.setdefault(key, []).append(connection)
+
+    def _close_idle(self):
+        idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="async-transport", daemon=True).start()
+            return self._loop
@@ -0,0 +1,51 @@
+import threading
+from typing import Callable, List
+
+
+class Cancelled(Exception):
+    """Raised on the worker when the work it was doing got cancelled"""
+
+
+class CancellationToken:
+    """Thread-safe flag set from the GUI thread and checked by the worker it was handed to.
+
+    Callbacks registered with `on_cancel` run on the cancelling thread, typically to shut a socket down so that a
+    worker blocked reading it returns right away.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self):
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def raise_if_cancelled(self):
+        if self._cancelled:
+            raise Cancelled()
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Registers a callback run once on cancellation, right away if already cancelled, returns its remover"""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
@@ -1,53 +1,178 @@
 import json
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterator, List
 
-from urllib import request
+from urllib.error import HTTPError
 from urllib.parse import urljoin
 
 from arcane_illusion.constants import EXTENSION_ID, EXTENSION_VERSION
+from arcane_illusion.image_generation.async_transport import AsyncTransport
+from arcane_illusion.image_generation.cancellation import CancellationToken
+from arcane_illusion.image_generation.connection_pool import ConnectionPool, Timeout, shared_pool
+from arcane_illusion.image_generation.request_body import RequestBody
 from arcane_illusion.image_generation.response import GenerationResponse, ProgressResponse
+from arcane_illusion.image_generation.streaming import GenerationStream
 from arcane_illusion.settings import Options
+from arcane_illusion.tracing import span
+
+# FastAPI error types of a body which is not JSON at all, as a gzip body is to a backend not decoding it
+_DECODE_ERRORS = ("json_invalid", "value_error.jsondecode")
+# FastAPI detail of a body it could not read
+_PARSE_ERROR = "There was an error parsing the body"
+# Seconds before compressing again for a backend which rejected a compressed body
+_COMPRESSION_RETRY = 3600.0
+# Backend URLs mapped to the time until which their payloads are sent uncompressed, shared by every client
+_uncompressed_until: Dict[str, float] = {}
+
+
+def _rejects_compression(e: HTTPError) -> bool:
+    """Whether the error status answers the body encoding, not a parameter the backend does not accept"""
+    if e.code == 415:
+        return True
+    if e.code not in (400, 422):
+        return False
+    try:
+        detail = json.loads(e.read())["detail"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+    if isinstance(detail, list):
+        return any(isinstance(error, dict) and error.get("type") in _DECODE_ERRORS for error in detail)
+    return detail == _PARSE_ERROR
 
 
 class Client:
+    """Stable Diffusion WebUI API client.
 
-    def __init__(self) -> None:
+    Requests go through the connection pool, or through the asyncio transport when one is given. In that case the
+    `*_async` coroutines are meant to be run on the transport event loop, and the blocking methods are thin wrappers
+    waiting for them. Generations always go through the pool, whose response is read incrementally by
+    `GenerationStream`, as the transport only hands out whole responses.
+
+    Generation payloads are streamed rather than serialized up front. With `compress`, they are gzipped unless the
+    backend recently answered that it cannot read a compressed body, in which case they are sent as is.
+    """
+
+    def __init__(self, url: str = None, pool: ConnectionPool = None, timeout: Timeout = None,
+                 transport: AsyncTransport = None, compress: bool = False) -> None:
         super().__init__()
         self._options = Options()
+        self._url = url or self._options.url
+        self._pool = pool or shared_pool
+        self._transport = transport
+        self._timeout = timeout or (self._options.connect_timeout, self._options.read_timeout)
+        self._compress = compress
         self._headers = {
             "User-Agent": f"{EXTENSION_ID}/{EXTENSION_VERSION}"
         }
 
+    @property
+    def url(self) -> str:
+        return self._url
+
     def get_models(self):
-        path = "/sdapi/v1/sd-models"
-        response = self._request(path)
-        return [item["model_name"] for item in response]
+        return list(self.get_model_hashes())
+
+    def get_model_hashes(self):
+        return self._model_hashes(self._request("/sdapi/v1/sd-models"))
+
+    async def get_model_hashes_async(self):
+        return self._model_hashes(await self._request_async("/sdapi/v1/sd-models"))
+
+    @staticmethod
+    def _model_hashes(response) -> Dict[str, str]:
+        return {item["model_name"]: item.get("sha256") or item.get("hash") for item in response}
 
     def get_samplers(self):
-        path = "/sdapi/v1/samplers"
-        response = self._request(path)
+        return self._samplers(self._request("/sdapi/v1/samplers"))
+
+    async def get_samplers_async(self):
+        return self._samplers(await self._request_async("/sdapi/v1/samplers"))
+
+    @staticmethod
+    def _samplers(response) -> List[str]:
         return [item["name"] for item in response]
 
-    def generate(self, data):
-        path = "/sdapi/v1/txt2img"
+    def generate(self, data, endpoint="txt2img", token: CancellationToken = None):
+        """Whole response at once, holding every image of the batch. Kept for scripts, the plugin uses
+        `generate_stream`.
+        """
+        with self.generate_stream(data, endpoint, token) as stream:
+            images = list(stream)
+            return GenerationResponse(images=images, parameters=stream.parameters, info=stream.info)
+
+    @contextmanager
+    def generate_stream(self, data, endpoint="txt2img", token: CancellationToken = None) -> Iterator[GenerationStream]:
+        """Yields a stream handing out the decoded images one at a time as the response arrives.
+
+        Cancelling the token makes both the request and the stream raise `Cancelled`.
+        """
+        url = urljoin(self._url, f"/sdapi/v1/{endpoint}")
+        compress = self._compress and time.monotonic() >= _uncompressed_until.get(self._url, 0.0)
+        with ExitStack() as stack:
+            try:
+                stream = stack.enter_context(self._post_stream(url, data, compress, token))
+            except HTTPError as e:
+                if not compress or not _rejects_compression(e):
+                    raise
+                _uncompressed_until[self._url] = time.monotonic() + _COMPRESSION_RETRY
+                stream = stack.enter_context(self._post_stream(url, data, False, token))
+            yield stream
+
+    @contextmanager
+    def _post_stream(self, url, data, compress: bool, token: CancellationToken = None) -> Iterator[GenerationStream]:
         headers = {
             "Content-Type": "application/json"
         }
-        response = self._request(path, method="POST", data=json.dumps(data).encode('utf-8'), headers=headers)
-        return GenerationResponse(**response)
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+        body = RequestBody(data, compress)
+        with self._pool.urlopen(url, "POST", body, {**self._headers, **headers}, self._timeout, token) as res:
+            yield GenerationStream(res, token=token)
+            res.read()
+
+    def progress(self, current_image: bool = False):
+        """Meant for ProgressPoller, which polls from a single thread over its own connection"""
+        return self._progress(self._request(self._progress_path(current_image)))
+
+    async def progress_async(self, current_image: bool = False):
+        return self._progress(await self._request_async(self._progress_path(current_image)))
 
-    def progress(self):
-        """Not helpful as multiple requests crash Krita"""
-        path = "/sdapi/v1/progress"
-        response = self._request(path)
-        return ProgressResponse(**response)
+    @staticmethod
+    def _progress_path(current_image: bool) -> str:
+        return "/sdapi/v1/progress" if current_image else "/sdapi/v1/progress?skip_current_image=true"
+
+    @staticmethod
+    def _progress(response) -> ProgressResponse:
+        return ProgressResponse(progress=response["progress"], eta_relative=response["eta_relative"],
+                                current_image=response.get("current_image"))
+
+    def interrupt(self):
+        """Asks the backend to stop the generation it is running, which then returns what it has so far"""
+        self._request("/sdapi/v1/interrupt", "POST", b"")
+
+    async def interrupt_async(self):
+        await self._request_async("/sdapi/v1/interrupt", "POST", b"")
 
     def get_control_net_models(self):
-        path = "/controlnet/model_list"
-        response = self._request(path)
-        return response["model_list"]
+        return self._request("/controlnet/model_list")["model_list"]
+
+    async def get_control_net_models_async(self):
+        return (await self._request_async("/controlnet/model_list"))["model_list"]
+
+    async def _request_async(self, path, method=None, data=None, headers=None):
+        url = urljoin(self._url, path)
+        response = await self._transport.request(url, method, data, {**self._headers, **(headers or {})},
+                                                 self._timeout)
+        with span("json.parse", path=path):
+            return json.loads(response.body) if response.body else None
 
     def _request(self, path, method=None, data=None, headers=None):
-        url = urljoin(self._options.url, path)
-        req = request.Request(url=url, method=method, headers={**self._headers, **(headers or {})})
-        with request.urlopen(req, data) as res:
-            return json.loads(res.read())
+        if self._transport is not None:
+            return self._transport.call(self._request_async(path, method, data, headers))
+        url = urljoin(self._url, path)
+        with self._pool.urlopen(url, method, data, {**self._headers, **(headers or {})}, self._timeout) as res:
+            with span("http.read", path=path):
+                body = res.read()
+        with span("json.parse", path=path):
+            return json.loads(body) if body else None
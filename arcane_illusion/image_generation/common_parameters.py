@@ -68,6 +68,13 @@ class CommonParameters(QWidget):
         layout.addWidget(self._cfg_scale)
         layout.end_row()
 
+        self._batch_size = QSpinBox()
+        self._batch_size.setRange(1, 64)
+        self._batch_size.setToolTip("Images generated together in a single request")
+        layout.add_widget(QLabel("Batch"))
+        layout.add_widget(self._batch_size)
+        layout.end_row()
+
         self.setLayout(layout)
 
     def _connect(self):
@@ -81,17 +88,20 @@ class CommonParameters(QWidget):
         self._height.valueChanged.connect(lambda height: setattr(self._parameters, "height", height))
         self._seed.valueChanged.connect(lambda seed: setattr(self._parameters, "seed", seed))
         self._cfg_scale.valueChanged.connect(lambda cfg_scale: setattr(self._parameters, "cfg_scale", cfg_scale))
+        self._batch_size.valueChanged.connect(lambda batch_size: setattr(self._parameters, "batch_size", batch_size))
 
     def update_model_options(self, options):
         self._model.blockSignals(True)
         self._model.clear()
         self._model.addItems(options)
+        self._model.setCurrentText(self._parameters.sd_model)
         self._model.blockSignals(False)
 
     def update_sampler_options(self, options):
         self._sampler.blockSignals(True)
         self._sampler.clear()
         self._sampler.addItems(options)
+        self._sampler.setCurrentText(self._parameters.sampler)
         self._sampler.blockSignals(False)
 
     def populate_parameters(self):
@@ -104,3 +114,4 @@ class CommonParameters(QWidget):
         self._height.setValue(getattr(self._parameters, "height"))
         self._seed.setValue(getattr(self._parameters, "seed"))
         self._cfg_scale.setValue(getattr(self._parameters, "cfg_scale"))
+        self._batch_size.setValue(getattr(self._parameters, "batch_size"))
@@ -0,0 +1,204 @@
+import io
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http import client as http_client
+from typing import Deque, Dict, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+from arcane_illusion.tracing import span
+from .cancellation import CancellationToken, Cancelled
+
+# Scheme, host and port, connections are pooled per key
+Key = Tuple[str, str, int]
+# Connect and read timeouts in seconds
+Timeout = Tuple[float, float]
+
+# Errors raised by a pooled socket the server has already closed. The request is sent again once on a new connection,
+# unless the connection was new already.
+STALE_ERRORS = (http_client.RemoteDisconnected, http_client.BadStatusLine, ConnectionResetError,
+                ConnectionAbortedError, BrokenPipeError)
+
+
+def split_url(url: str) -> Tuple[Key, str]:
+    """Pool key of the URL and the target sent in the request line"""
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+    target = parts.path or "/"
+    if parts.query:
+        target += "?" + parts.query
+    return key, target
+
+
+@dataclass()
+class PoolStats:
+    hits: int
+    misses: int
+    evictions: int
+    reconnects: int
+    idle: int
+
+
+class _Watch:
+    """Connection in use by a request, shut down when its cancellation token fires"""
+    connection: Optional[http_client.HTTPConnection] = None
+    cancelled = False
+
+    def shutdown(self):
+        self.cancelled = True
+        sock = self.connection and self.connection.sock
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of HTTP/1.1 keep-alive connections, bounded per host"""
+
+    def __init__(self, max_per_host: int = 8, idle_timeout: float = 30.0, timeout: Timeout = (10.0, 600.0)) -> None:
+        super().__init__()
+        self._max_per_host = max_per_host
+        self._idle_timeout = idle_timeout
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._idle: Dict[Key, Deque[Tuple[http_client.HTTPConnection, float]]] = {}
+        self._slots: Dict[Key, threading.BoundedSemaphore] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reconnects = 0
+
+    def stats(self) -> PoolStats:
+        with self._lock:
+            idle = sum(len(connections) for connections in self._idle.values())
+            return PoolStats(self.hits, self.misses, self.evictions, self.reconnects, idle)
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection, _ in connections:
+                connection.close()
+
+    @contextmanager
+    def urlopen(self, url, method=None, data=None, headers=None, timeout: Timeout = None,
+                token: CancellationToken = None):
+        """Send a request and yield the `HTTPResponse`, raising `HTTPError` on non 2xx statuses.
+
+        The connection returns to the pool only when the response has been read to the end. Cancelling the token
+        shuts the socket down, so whatever blocks on it raises `Cancelled` right away.
+        """
+        key, target = split_url(url)
+        method = method or ("POST" if data is not None else "GET")
+
+        watch = _Watch()
+        remove_watch = token.on_cancel(watch.shutdown) if token else None
+        slot = self._slot(key)
+        slot.acquire()
+        try:
+            if token:
+                token.raise_if_cancelled()
+            with span("http.round_trip", method=method, path=urlsplit(url).path):
+                connection, response = self._send(key, method, target, data, headers or {}, timeout or self._timeout,
+                                                  watch)
+            try:
+                if not 200 <= response.status < 300:
+                    # The start of the error body is kept readable, the connection is closed right after
+                    raise HTTPError(url, response.status, response.reason, response.headers,
+                                    io.BytesIO(response.read(1 << 16)))
+                yield response
+            except BaseException:
+                connection.close()
+                raise
+            self._release(key, connection, response)
+        except Exception as e:
+            if token and token.cancelled and not isinstance(e, Cancelled):
+                raise Cancelled() from e
+            raise
+        finally:
+            slot.release()
+            if remove_watch:
+                remove_watch()
+
+    def _send(self, key, method, target, data, headers, timeout: Timeout, watch: _Watch):
+        connection, reused = self._checkout(key)
+        try:
+            return connection, self._exchange(connection, method, target, data, headers, timeout, watch)
+        except STALE_ERRORS:
+            connection.close()
+            if not reused:
+                raise
+        with self._lock:
+            self.reconnects += 1
+        connection = self._connect(key)
+        try:
+            return connection, self._exchange(connection, method, target, data, headers, timeout, watch)
+        except BaseException:
+            connection.close()
+            raise
+
+    @staticmethod
+    def _exchange(connection, method, target, data, headers, timeout: Timeout, watch: _Watch):
+        connect_timeout, read_timeout = timeout
+        if connection.sock is None:
+            connection.timeout = connect_timeout
+            connection.connect()
+        connection.sock.settimeout(read_timeout)
+        watch.connection = connection
+        if watch.cancelled:
+            raise Cancelled()
+        connection.request(method, target, body=data, headers=headers)
+        return connection.getresponse()
+
+    def _slot(self, key) -> threading.BoundedSemaphore:
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(self._max_per_host)
+            return self._slots[key]
+
+    def _checkout(self, key):
+        now = time.monotonic()
+        expired = []
+        connection = None
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                candidate, last_used = idle.pop()
+                if now - last_used > self._idle_timeout:
+                    expired.append(candidate)
+                    continue
+                connection = candidate
+                break
+            self.evictions += len(expired)
+            if connection:
+                self.hits += 1
+            else:
+                self.misses += 1
+        for candidate in expired:
+            candidate.close()
+        if connection:
+            return connection, True
+        return self._connect(key), False
+
+    @staticmethod
+    def _connect(key) -> http_client.HTTPConnection:
+        scheme, host, port = key
+        if scheme == "https":
+            return http_client.HTTPSConnection(host, port)
+        return http_client.HTTPConnection(host, port)
+
+    def _release(self, key, connection, response):
+        if not response.isclosed() or response.will_close:
+            connection.close()
+            return
+        with self._lock:
+            self._idle.setdefault(key, deque()).append((connection, time.monotonic()))
+
+
+shared_pool = ConnectionPool()
@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+
+from PyQt5.QtCore import QByteArray, QTimer, Qt
+from PyQt5.QtGui import QImage
+
+from arcane_illusion.tracing import span
+from .image_ingest import IngestedImage, PixelFormat
+from .sweep import SweepCell
+
+_RGBA_U8 = PixelFormat("RGBA", "U8", "sRGB-elle-V2-srgbtrc.icc")
+
+
+@dataclass()
+class SweepImage:
+    """Image of a sweep cell, decoded for its own layer and as a thumbnail for the contact sheet"""
+    cell: SweepCell
+    image: IngestedImage
+    thumbnail: bytes
+
+
+def thumbnail(data, width: int, height: int) -> bytes:
+    """8-bit BGRA pixels of the encoded image scaled to fill a cell, safe to call off the GUI thread"""
+    with span("sweep.thumbnail"):
+        image = QImage.fromData(data)
+        if image.isNull():
+            raise ValueError("Cannot decode generated image")
+        image = image.scaled(width, height, transformMode=Qt.SmoothTransformation).convertToFormat(
+            QImage.Format_ARGB32)
+        bits = image.constBits()
+        bits.setsize(image.bytesPerLine() * image.height())
+        return bits.asstring()
+
+
+class ContactSheet:
+    """Layer tiling the images of a sweep over the canvas, a row per prompt and CFG scale and a column per seed.
+
+    The layer stays 8-bit sRGB whatever the document format, it is only meant to compare the images at a glance.
+    """
+
+    def __init__(self, document, name: str, rows: int, columns: int, refresh_interval: int = 250, parent=None):
+        super().__init__()
+        self.cell_width = max(1, document.width() // columns)
+        self.cell_height = max(1, document.height() // rows)
+        self._layer = document.createNode(name, "paintlayer")
+        document.rootNode().addChildNode(self._layer, None)
+        if PixelFormat.of(document) != _RGBA_U8:
+            self._layer.setColorSpace(_RGBA_U8.color_model, _RGBA_U8.color_depth, _RGBA_U8.color_profile)
+        self._timer = QTimer(parent)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(refresh_interval)
+        self._timer.timeout.connect(document.refreshProjection)
+
+    def add(self, cell: SweepCell, pixels: bytes):
+        with span("sweep.sheet"):
+            self._layer.setPixelData(QByteArray.fromRawData(pixels), cell.column * self.cell_width,
+                                     cell.row * self.cell_height, self.cell_width, self.cell_height)
+        if not self._timer.isActive():
+            self._timer.start()
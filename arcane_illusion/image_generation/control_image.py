@@ -0,0 +1,87 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from PyQt5.QtGui import QImage
+
+from arcane_illusion.tracing import span
+from .image_ingest import PixelFormat, encode_png
+
+_RGBA_U8 = PixelFormat("RGBA", "U8", "sRGB-elle-V2-srgbtrc.icc")
+
+
+@dataclass()
+class ControlLayer:
+    """Raw 8-bit BGRA pixels of a layer, read on the GUI thread and encoded on a worker"""
+    name: str
+    width: int
+    height: int
+    pixels: bytes
+
+
+def read_control_layer(document, node) -> ControlLayer:
+    """Reads the layer over the whole canvas, through a converted copy when it is not 8-bit sRGB"""
+    source = node
+    if PixelFormat.of(node) != _RGBA_U8:
+        source = node.duplicate()
+        source.setColorSpace(_RGBA_U8.color_model, _RGBA_U8.color_depth, _RGBA_U8.color_profile)
+    with span("control.read"):
+        pixels = bytes(source.pixelData(0, 0, document.width(), document.height()))
+    return ControlLayer(node.name(), document.width(), document.height(), pixels)
+
+
+class ControlImageCache:
+    """Base64 PNGs of the control layers last sent, keyed by a hash of their pixels.
+
+    Hashing a layer is much cheaper than encoding it, so generating again from an unchanged layer skips the PNG and
+    base64 encoding entirely.
+    """
+
+    def __init__(self, max_entries: int = 8) -> None:
+        super().__init__()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(layer: ControlLayer) -> str:
+        with span("control.hash"):
+            h = hashlib.blake2b(digest_size=16)
+            h.update(f"{layer.width}x{layer.height}".encode("ascii"))
+            h.update(layer.pixels)
+            return h.hexdigest()
+
+    def encode(self, layer: ControlLayer, digest: str = None) -> str:
+        """Encoded control image for the layer, safe to call off the GUI thread"""
+        digest = digest or self.digest(layer)
+        with self._lock:
+            encoded = self._entries.get(digest)
+            if encoded is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return encoded
+            self.misses += 1
+        with span("control.encode", width=layer.width, height=layer.height):
+            encoded = encode_png(QImage(layer.pixels, layer.width, layer.height, QImage.Format_ARGB32))
+        with self._lock:
+            self._entries[digest] = encoded
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return encoded
+
+
+def with_control_net(data: dict, parameters: dict, image: str) -> dict:
+    """Request payload running a ControlNet unit on the image, which is used as is as the control map"""
+    unit = {
+        "input_image": image,
+        "module": "none",
+        "model": parameters["control_net_model"],
+        "weight": parameters["control_net_weight"],
+        "guidance_start": parameters["control_net_guidance_start"],
+        "guidance_end": parameters["control_net_guidance_end"],
+        "resize_mode": "Crop and Resize",
+    }
+    return {**data, "alwayson_scripts": {**data.get("alwayson_scripts", {}), "controlnet": {"args": [unit]}}}
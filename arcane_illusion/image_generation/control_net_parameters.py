@@ -0,0 +1,87 @@
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtWidgets import QWidget, QLabel, QCheckBox, QComboBox, QDoubleSpinBox
+
+from arcane_illusion.settings import ControlNetParameters
+from arcane_illusion.widgets import AutoGridLayout
+
+
+class ControlNetParametersWidget(QWidget):
+    # Emitted the first time ControlNet gets enabled, the model list is only needed from then on
+    models_requested = pyqtSignal()
+
+    def __init__(self, parameters: ControlNetParameters):
+        super().__init__()
+        self._parameters = parameters
+        self._models_requested = False
+        self._build()
+        self._connect()
+        self._update_enabled(False)
+
+    def _build(self):
+        layout = AutoGridLayout()
+
+        self._enabled = QCheckBox("ControlNet")
+        self._enabled.setToolTip("Use the active layer as the control map, e.g. a segmentation map")
+        layout.add_widget(self._enabled)
+        self._model = QComboBox()
+        layout.add_widget(self._model, 3)
+        layout.end_row()
+
+        self._weight = QDoubleSpinBox()
+        self._weight.setDecimals(2)
+        self._weight.setSingleStep(0.05)
+        self._weight.setRange(0, 2)
+        layout.add_widget(QLabel("Weight"))
+        layout.add_widget(self._weight)
+        layout.end_row()
+
+        self._guidance_start = QDoubleSpinBox()
+        self._guidance_start.setDecimals(2)
+        self._guidance_start.setSingleStep(0.05)
+        self._guidance_start.setRange(0, 1)
+        layout.add_widget(QLabel("Start"))
+        layout.add_widget(self._guidance_start)
+
+        self._guidance_end = QDoubleSpinBox()
+        self._guidance_end.setDecimals(2)
+        self._guidance_end.setSingleStep(0.05)
+        self._guidance_end.setRange(0, 1)
+        layout.add_widget(QLabel("End"))
+        layout.add_widget(self._guidance_end)
+        layout.end_row()
+
+        self.setLayout(layout)
+
+    def _connect(self):
+        self._enabled.toggled.connect(self._on_enabled)
+        self._model.currentTextChanged.connect(lambda model: setattr(self._parameters, "control_net_model", model))
+        self._weight.valueChanged.connect(lambda value: setattr(self._parameters, "control_net_weight", value))
+        self._guidance_start.valueChanged.connect(
+            lambda value: setattr(self._parameters, "control_net_guidance_start", value))
+        self._guidance_end.valueChanged.connect(
+            lambda value: setattr(self._parameters, "control_net_guidance_end", value))
+
+    def _on_enabled(self, enabled: bool):
+        self._parameters.control_net_enabled = enabled
+        self._update_enabled(enabled)
+        if enabled and not self._models_requested:
+            self._models_requested = True
+            self.models_requested.emit()
+
+    def _update_enabled(self, enabled: bool):
+        for widget in (self._model, self._weight, self._guidance_start, self._guidance_end):
+            widget.setEnabled(enabled)
+
+    def update_model_options(self, options):
+        self._model.blockSignals(True)
+        self._model.clear()
+        self._model.addItems(options)
+        self._model.setCurrentText(self._parameters.control_net_model)
+        self._model.blockSignals(False)
+
+    def populate_parameters(self):
+        self._model.setCurrentText(getattr(self._parameters, "control_net_model"))
+        self._weight.setValue(getattr(self._parameters, "control_net_weight"))
+        self._guidance_start.setValue(getattr(self._parameters, "control_net_guidance_start"))
+        self._guidance_end.setValue(getattr(self._parameters, "control_net_guidance_end"))
+        self._enabled.setChecked(getattr(self._parameters, "control_net_enabled"))
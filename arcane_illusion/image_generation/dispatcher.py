@@ -0,0 +1,302 @@
+import asyncio
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.error import HTTPError
+
+from arcane_illusion.image_generation.async_transport import AsyncTransport
+from arcane_illusion.image_generation.cancellation import CancellationToken
+from arcane_illusion.image_generation.client import Client
+from arcane_illusion.image_generation.connection_pool import ConnectionPool, Timeout
+from arcane_illusion.image_generation.response import GenerationResponse
+from arcane_illusion.image_generation.streaming import GenerationStream
+
+
+class NoBackendError(OSError):
+    pass
+
+
+def is_backend_failure(e: BaseException) -> bool:
+    """Whether the error means the backend cannot be reached, rather than an HTTP error status it answered with.
+
+    An error status is the backend rejecting the request itself, e.g. an unknown sampler, which every other backend
+    would reject too, so it neither fails over nor counts against the backend.
+    """
+    return isinstance(e, OSError) and not isinstance(e, HTTPError)
+
+
+@dataclass()
+class Backend:
+    client: Client
+    outstanding: int = 0
+    # Exponentially weighted moving average of the request duration in seconds
+    latency: float = 0.0
+    healthy: bool = True
+    failed_at: float = 0.0
+    # Model names mapped to their hash
+    models: Optional[Dict[str, str]] = field(default=None)
+
+    @property
+    def url(self) -> str:
+        return self.client.url
+
+
+class Dispatcher:
+    """Spreads generations over several backends.
+
+    Picks the backend with the fewest outstanding requests weighted by its measured latency among the ones serving
+    the requested model, and fails over to the next one when a backend cannot be reached. Failed backends are
+    probed again once `retry_after` seconds have passed. A backend runs at most `max_outstanding` generations at a
+    time, further ones wait for a backend serving their model to free up, whichever queue they came from.
+    """
+    _smoothing = 0.3
+
+    def __init__(self, urls: List[str], max_outstanding: int = 1, retry_after: float = 30.0,
+                 pool: ConnectionPool = None, timeout: Timeout = None, transport: AsyncTransport = None,
+                 compress: bool = False) -> None:
+        super().__init__()
+        self._backends = [Backend(Client(url, pool, timeout, transport, compress)) for url in urls]
+        self._max_outstanding = max_outstanding
+        self._retry_after = retry_after
+        self._lock = threading.Lock()
+        # Notified whenever a backend finishes a request
+        self._released = threading.Condition(self._lock)
+
+    @property
+    def key(self) -> str:
+        return " ".join(backend.url for backend in self._backends)
+
+    @property
+    def backends(self) -> List[Backend]:
+        return list(self._backends)
+
+    def busy_backends(self) -> List[Backend]:
+        with self._lock:
+            return [backend for backend in self._backends if backend.outstanding]
+
+    def check_health(self):
+        """Refreshes the health and model list of every backend"""
+        for backend in self._backends:
+            try:
+                models = backend.client.get_model_hashes()
+                with self._lock:
+                    backend.models = models
+                    backend.healthy = True
+            except OSError as e:
+                if not is_backend_failure(e):
+                    raise
+                self._mark_failed(backend)
+
+    async def check_health_async(self):
+        """Same as `check_health`, querying all the backends at once on the transport event loop"""
+        results = await asyncio.gather(*(backend.client.get_model_hashes_async() for backend in self._backends),
+                                       return_exceptions=True)
+        for backend, result in zip(self._backends, results):
+            if is_backend_failure(result):
+                self._mark_failed(backend)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                with self._lock:
+                    backend.models = result
+                    backend.healthy = True
+
+    def get_models(self) -> List[str]:
+        self.check_health()
+        return self._healthy_models()
+
+    async def get_models_async(self) -> List[str]:
+        await self.check_health_async()
+        return self._healthy_models()
+
+    def _healthy_models(self) -> List[str]:
+        models = set()
+        for backend in self._backends:
+            if backend.healthy and backend.models:
+                models.update(backend.models)
+        if not any(backend.healthy for backend in self._backends):
+            raise NoBackendError("No backend available")
+        return sorted(models)
+
+    def model_hash(self, model: Optional[str]) -> Optional[str]:
+        """Hash of the model as reported by the backends, None when unknown"""
+        for backend in self._backends:
+            if model and backend.models and backend.models.get(model):
+                return backend.models[model]
+        return None
+
+    def get_samplers(self) -> List[str]:
+        return self.call(lambda client: client.get_samplers())
+
+    def get_control_net_models(self) -> List[str]:
+        return self.call(lambda client: client.get_control_net_models())
+
+    async def get_samplers_async(self) -> List[str]:
+        return await self.call_async(lambda client: client.get_samplers_async())
+
+    async def get_control_net_models_async(self) -> List[str]:
+        return await self.call_async(lambda client: client.get_control_net_models_async())
+
+    async def call_async(self, request, model: str = None):
+        """Awaits `request(client)` on the best backend, failing over to the others on connection errors"""
+        errors = []
+        for backend in self._candidates(model):
+            started = time.monotonic()
+            with self._lock:
+                backend.outstanding += 1
+            try:
+                result = await request(backend.client)
+            except OSError as e:
+                self._release(backend)
+                if not is_backend_failure(e):
+                    raise
+                self._mark_failed(backend)
+                errors.append(e)
+                continue
+            except BaseException:
+                self._release(backend)
+                raise
+            self._release(backend, started)
+            with self._lock:
+                backend.healthy = True
+            return result
+        if errors:
+            raise errors[-1]
+        raise NoBackendError(f"No backend available for model {model}" if model else "No backend available")
+
+    def call(self, request, model: str = None):
+        """Runs `request(client)` on the best backend, failing over to the others on connection errors"""
+        backend, result, stack = self._open(model, lambda client, _: request(client))
+        stack.close()
+        return result
+
+    def interrupt(self, backends: List[Backend] = None):
+        """Asks the given backends, every busy one by default, to stop the generation they are running"""
+        for backend in self.busy_backends() if backends is None else backends:
+            try:
+                backend.client.interrupt()
+            except OSError as e:
+                if is_backend_failure(e):
+                    self._mark_failed(backend)
+
+    async def interrupt_async(self, backends: List[Backend] = None):
+        """Same as `interrupt`, asking all the backends at once"""
+        backends = self.busy_backends() if backends is None else backends
+        results = await asyncio.gather(*(backend.client.interrupt_async() for backend in backends),
+                                       return_exceptions=True)
+        for backend, result in zip(backends, results):
+            if is_backend_failure(result):
+                self._mark_failed(backend)
+
+    def generate(self, data, endpoint="txt2img", token: CancellationToken = None) -> GenerationResponse:
+        """Whole response at once, holding every image of the batch. Kept for scripts, the plugin uses
+        `generate_stream`.
+        """
+        with self.generate_stream(data, endpoint, token) as stream:
+            images = list(stream)
+            return GenerationResponse(images=images, parameters=stream.parameters, info=stream.info)
+
+    @contextmanager
+    def generate_stream(self, data, endpoint="txt2img", token: CancellationToken = None) -> Iterator[GenerationStream]:
+        backend, stream, stack = self._open(
+            data.get("sd_model"),
+            lambda client, stack: stack.enter_context(client.generate_stream(data, endpoint, token)), True, token)
+        with stack:
+            try:
+                yield stream
+            except OSError as e:
+                if is_backend_failure(e):
+                    self._mark_failed(backend)
+                raise
+
+    def _open(self, model, opener, limit: bool = False,
+              token: CancellationToken = None) -> Tuple[Backend, object, ExitStack]:
+        """Calls `opener(client, stack)` on the candidates in turn until one of them does not fail to connect.
+
+        Returns the backend, the opener result and the stack releasing the backend once closed. With `limit`, only
+        backends below `max_outstanding` are tried, waiting for one to free up when they are all busy.
+        """
+        while True:
+            errors = []
+            busy = False
+            for backend in self._candidates(model):
+                with self._lock:
+                    if limit and backend.outstanding >= self._max_outstanding:
+                        busy = True
+                        continue
+                    backend.outstanding += 1
+                stack = ExitStack()
+                stack.callback(self._release, backend, time.monotonic())
+                try:
+                    result = opener(backend.client, stack)
+                except OSError as e:
+                    stack.pop_all()
+                    self._release(backend)
+                    if not is_backend_failure(e):
+                        raise
+                    self._mark_failed(backend)
+                    errors.append(e)
+                    continue
+                except BaseException:
+                    stack.pop_all()
+                    self._release(backend)
+                    raise
+                with self._lock:
+                    backend.healthy = True
+                return backend, result, stack
+            if errors:
+                raise errors[-1]
+            if not busy:
+                raise NoBackendError(f"No backend available for model {model}" if model else "No backend available")
+            self._wait_for_release(model, token)
+
+    def _wait_for_release(self, model: Optional[str], token: Optional[CancellationToken]):
+        """Blocks until a backend serving the model is below `max_outstanding`, or the token is cancelled"""
+        remove = token.on_cancel(self._notify) if token is not None else lambda: None
+        try:
+            with self._released:
+                while True:
+                    if token is not None:
+                        token.raise_if_cancelled()
+                    candidates = self._eligible(model)
+                    if not candidates or any(backend.outstanding < self._max_outstanding for backend in candidates):
+                        return
+                    # Also woken up now and then, as failed backends become eligible again with time
+                    self._released.wait(self._retry_after)
+        finally:
+            remove()
+
+    def _notify(self):
+        with self._released:
+            self._released.notify_all()
+
+    def _eligible(self, model: Optional[str]) -> List[Backend]:
+        """Backends serving the model and not known to be down, the lock must be held"""
+        now = time.monotonic()
+        return [
+            backend for backend in self._backends
+            if (backend.healthy or now - backend.failed_at > self._retry_after)
+            and (not model or backend.models is None or model in backend.models)
+        ]
+
+    def _candidates(self, model: str = None) -> List[Backend]:
+        with self._lock:
+            candidates = self._eligible(model)
+            return sorted(candidates, key=lambda backend: (
+                backend.outstanding >= self._max_outstanding,
+                (backend.outstanding + 1) * backend.latency,
+            ))
+
+    def _release(self, backend: Backend, started: float = None):
+        with self._released:
+            backend.outstanding -= 1
+            if started is not None:
+                backend.latency += self._smoothing * (time.monotonic() - started - backend.latency)
+            self._released.notify_all()
+
+    def _mark_failed(self, backend: Backend):
+        with self._lock:
+            backend.healthy = False
+            backend.failed_at = time.monotonic()
@@ -0,0 +1,159 @@
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Iterable, List
+
+from PyQt5.QtCore import QObject, QThreadPool, pyqtSignal, pyqtSlot
+
+from .cancellation import CancellationToken
+from .generation_task import GenerationTask, Signals
+
+
+@dataclass()
+class GenerationJob:
+    id: int
+    data: dict
+    backend: str
+    # Called on a worker with the data and the token of the job
+    runner: Callable[[dict, CancellationToken], object] = field(repr=False)
+    token: CancellationToken = field(default_factory=CancellationToken, repr=False)
+
+
+@dataclass()
+class QueueStats:
+    pending: int
+    in_flight: int
+    images_per_minute: float
+
+
+def seed_range(data: dict, count: int) -> List[dict]:
+    """Parameter sets whose seeds follow each other, a random seed (-1) stays random.
+
+    The backend seeds the images of a request `seed` to `seed + batch_size * n_iter - 1`, so each set starts past the
+    images of the previous one.
+    """
+    seed = data["seed"]
+    step = data.get("batch_size", 1) * data.get("n_iter", 1)
+    return [{**data, "seed": seed if seed == -1 else seed + i * step} for i in range(count)]
+
+
+def prompt_list(data: dict, prompts: Iterable[str]) -> List[dict]:
+    return [{**data, "prompt": prompt} for prompt in prompts]
+
+
+class GenerationQueue(QObject):
+    """Queue of generation jobs dispatched on a dedicated pool with at most `max_in_flight` jobs per backend"""
+    _ids = itertools.count(1)
+    _throughput_window = 60.0
+
+    job_started = pyqtSignal(GenerationJob)
+    image_ready = pyqtSignal(GenerationJob, object)
+    job_finished = pyqtSignal(GenerationJob, object)
+    job_failed = pyqtSignal(GenerationJob, Exception)
+    stats_changed = pyqtSignal(QueueStats)
+
+    def __init__(self, max_in_flight: int = 1, parent=None):
+        super().__init__(parent)
+        self._max_in_flight = max_in_flight
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max_in_flight)
+        self._pending: List[GenerationJob] = []
+        self._running: Dict[Signals, GenerationJob] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._completed: Deque[float] = deque()
+
+    def set_max_in_flight(self, max_in_flight: int):
+        self._max_in_flight = max_in_flight
+        self._pool.setMaxThreadCount(max_in_flight * max(1, len(self._in_flight)))
+        self._dispatch()
+
+    def submit(self, parameter_sets: Iterable[dict], backend: str, runner: Callable[[dict, CancellationToken], object]):
+        jobs = [GenerationJob(next(self._ids), data, backend, runner) for data in parameter_sets]
+        self._pending.extend(jobs)
+        self._dispatch()
+        return jobs
+
+    def pending(self) -> List[GenerationJob]:
+        return list(self._pending)
+
+    def cancel(self, job_id: int) -> bool:
+        """Removes a pending job, or cancels the token of a running one which then fails with `Cancelled`"""
+        for job in self._pending:
+            if job.id == job_id:
+                self._pending.remove(job)
+                self._emit_stats()
+                return True
+        for job in self._running.values():
+            if job.id == job_id:
+                job.token.cancel()
+                return True
+        return False
+
+    def cancel_all(self):
+        self._pending.clear()
+        for job in list(self._running.values()):
+            job.token.cancel()
+        self._emit_stats()
+
+    def move(self, job_id: int, index: int) -> bool:
+        """Moves a pending job to `index` in the queue"""
+        for job in self._pending:
+            if job.id == job_id:
+                self._pending.remove(job)
+                self._pending.insert(index, job)
+                self._emit_stats()
+                return True
+        return False
+
+    def is_idle(self) -> bool:
+        return not self._pending and not self._running
+
+    def stats(self) -> QueueStats:
+        now = time.monotonic()
+        while self._completed and now - self._completed[0] > self._throughput_window:
+            self._completed.popleft()
+        elapsed = min(self._throughput_window, now - self._completed[0]) if self._completed else 0
+        images_per_minute = len(self._completed) * 60 / elapsed if elapsed > 0 else 0.0
+        return QueueStats(len(self._pending), len(self._running), images_per_minute)
+
+    def _dispatch(self):
+        for job in list(self._pending):
+            if self._in_flight.get(job.backend, 0) >= self._max_in_flight:
+                continue
+            self._pending.remove(job)
+            self._in_flight[job.backend] = self._in_flight.get(job.backend, 0) + 1
+            self._pool.setMaxThreadCount(self._max_in_flight * len(self._in_flight))
+            task = GenerationTask(lambda job=job: job.runner(job.data, job.token))
+            self._running[task.signals] = job
+            task.signals.item.connect(self._on_item)
+            task.signals.finished.connect(self._on_finished)
+            task.signals.error.connect(self._on_error)
+            self.job_started.emit(job)
+            self._pool.start(task)
+        self._emit_stats()
+
+    def _emit_stats(self):
+        self.stats_changed.emit(self.stats())
+
+    def _complete(self) -> GenerationJob:
+        job = self._running.pop(self.sender())
+        self._in_flight[job.backend] -= 1
+        return job
+
+    @pyqtSlot(object)
+    def _on_item(self, item):
+        self._completed.append(time.monotonic())
+        self.image_ready.emit(self._running[self.sender()], item)
+
+    @pyqtSlot(object)
+    def _on_finished(self, result):
+        job = self._complete()
+        self.job_finished.emit(job, result)
+        self._dispatch()
+
+    @pyqtSlot(Exception)
+    def _on_error(self, e: Exception):
+        job = self._complete()
+        self.job_failed.emit(job, e)
+        self._dispatch()
@@ -1,17 +1,22 @@
+import inspect
 from typing import Callable, TypeVar, Generic
 
 from PyQt5.QtCore import QObject, QRunnable, QThread, pyqtSignal, pyqtSlot
 
+from arcane_illusion.tracing import span
+
 T = TypeVar("T")
 
 
 class Signals(QObject):
     started = pyqtSignal()
+    item = pyqtSignal(object)
     finished = pyqtSignal(object)
     error = pyqtSignal(Exception)
 
 
 class GenerationTask(QRunnable, Generic[T]):
+    """Runs the task on a worker thread, a task returning a generator has each item emitted as it is produced"""
     signals: Signals
 
     def __init__(self, task: Callable[[], T]):
@@ -22,6 +27,17 @@ class GenerationTask(QRunnable, Generic[T]):
     def run(self):
         try:
             self.signals.started.emit()
-            self.signals.finished.emit(self._task())
+            with span("task"):
+                result = self._task()
+                if inspect.isgenerator(result):
+                    result = self._drain(result)
+            self.signals.finished.emit(result)
         except Exception as e:
             self.signals.error.emit(e)
+
+    def _drain(self, generator):
+        while True:
+            try:
+                self.signals.item.emit(next(generator))
+            except StopIteration as stop:
+                return stop.value
@@ -1,29 +1,92 @@
-import base64
-from typing import ClassVar
+import asyncio
+import os
+from typing import Dict, List
+from PyQt5.QtCore import QObject, QStandardPaths, QThreadPool, pyqtSlot, pyqtSignal, qWarning, qInfo
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QMessageBox, QPushButton, QLabel, QSpinBox, QCheckBox
 
-from PyQt5.QtCore import QObject, QByteArray, QThreadPool, pyqtSlot, pyqtSignal, qWarning, qInfo
-from PyQt5.QtGui import QImage
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QMessageBox, QPushButton
+from krita import Krita
 
-from krita import Krita, DockWidget
-
-from arcane_illusion.settings import Parameters
-from .generation_task import GenerationTask
-from .client import Client
+from arcane_illusion.constants import EXTENSION_ID
+from arcane_illusion.settings import ControlNetParameters, Options, Parameters, SweepParameters, TileParameters, store
+from arcane_illusion.tracing import tracer
+from .async_transport import AsyncTransport
+from .cancellation import CancellationToken, Cancelled
+from .generation_queue import GenerationJob, GenerationQueue, seed_range
+from .generation_task import GenerationTask, Signals
+from .dispatcher import Dispatcher
 from .common_parameters import CommonParameters
+from .contact_sheet import ContactSheet, SweepImage, thumbnail
+from .control_image import ControlImageCache, ControlLayer, read_control_layer, with_control_net
+from .control_net_parameters import ControlNetParametersWidget
+from .image_ingest import IngestedImage, PixelFormat, ingest
+from .inpaint import ChangeTracker, Inpaint
+from .layer_inserter import LayerBatch, LayerInserter
+from .options_cache import OptionsCache
+from .preset_bar import PresetBar
+from .preview_layer import PreviewLayer
+from .progress_poller import ProgressPoller
 from .response import GenerationResponse
+from .result_cache import ResultCache
 from .status import Status
 from .status_bar import StatusBar
+from .sweep import SweepCell, expand, pack, parse_range
+from .sweep_parameters import SweepParametersWidget
+from .tile_parameters import TileParametersWidget
+from .tiled_img2img import TiledImg2Img
+from .trace_panel import TracePanel
 
 
-class _Widget(QWidget):
-    _thread_pool: QThreadPool = QThreadPool.globalInstance()
+class ImageGenerationWidget(QWidget):
     status_updated = pyqtSignal([Status, str])
 
     def __init__(self):
         super().__init__()
+        # Work outside the generation queue: option fetches, interrupts and inpainting. The dispatcher still holds
+        # the generations among them to max_in_flight per backend, and Cancel stops inpainting.
+        self._thread_pool = QThreadPool(self)
+        self._thread_pool.setMaxThreadCount(2)
         self._parameters = Parameters()
-        self._client = Client()
+        self._tile_parameters = TileParameters()
+        self._control_net_parameters = ControlNetParameters()
+        self._sweep_parameters = SweepParameters()
+        self._tiled = None
+        self._inpaint = None
+        self._change_tracker = ChangeTracker()
+        self._options = Options()
+        self._options.load()
+        if self._options.tracing:
+            directory = os.path.join(QStandardPaths.writableLocation(QStandardPaths.CacheLocation), EXTENSION_ID)
+            os.makedirs(directory, exist_ok=True)
+            tracer.enable(os.path.join(directory, "trace.jsonl"))
+        backend_urls = self._options.backend_urls()
+        timeout = (self._options.connect_timeout, self._options.read_timeout)
+        self._transport = AsyncTransport(timeout=timeout) if self._options.async_transport else None
+        if self._transport is not None:
+            # Otherwise the event loop thread and its connections outlive the docker
+            transport = self._transport
+            self.destroyed.connect(lambda *_: transport.close())
+        self._dispatcher = Dispatcher(backend_urls, self._options.max_in_flight, timeout=timeout,
+                                      transport=self._transport, compress=self._options.compress_uploads)
+        # Bounds the jobs of the whole cluster, the dispatcher keeps each backend to `max_in_flight` of them
+        self._queue = GenerationQueue(self._options.max_in_flight * len(backend_urls), self)
+        self._progress_poller = ProgressPoller(lambda: [backend.url for backend in self._dispatcher.busy_backends()],
+                                               transport=self._transport, parent=self)
+        self._preview = PreviewLayer(parent=self)
+        # Job last started, whose size the previews are scaled to and whose document they are drawn in
+        self._preview_job = None
+        self._inserter = LayerInserter(parent=self)
+        self._batches: Dict[int, LayerBatch] = {}
+        self._sheets: Dict[int, ContactSheet] = {}
+        self._failed = False
+        self._options_cache = OptionsCache()
+        self._result_cache = ResultCache(max_bytes=self._options.result_cache_size * 1024 * 1024)
+        result_cache = self._result_cache
+        self.destroyed.connect(lambda *_: result_cache.flush())
+        self._control_images = ControlImageCache()
+        self._pending_options = 0
+        # Signals of the fetches running on the transport, owned here until they deliver
+        self._fetches = set()
+        self._options_cold = True
         self._build_ui()
         self._connect_ui()
         self._load_options()
@@ -35,87 +98,499 @@ class _Widget(QWidget):
         self._status_bar = StatusBar(self)
         layout.addWidget(self._status_bar)
 
+        self._preset_bar = PresetBar(self)
+        layout.addWidget(self._preset_bar)
+
         self._common_parameters = CommonParameters(self._parameters)
         layout.addWidget(self._common_parameters)
 
+        self._control_net_parameters_widget = ControlNetParametersWidget(self._control_net_parameters)
+        layout.addWidget(self._control_net_parameters_widget)
+
+        buttons = QHBoxLayout()
+        self._count = QSpinBox(self)
+        self._count.setRange(1, 999)
+        self._count.setToolTip("Number of images to queue, with consecutive seeds when the seed is fixed")
+        buttons.addWidget(QLabel("Count"))
+        buttons.addWidget(self._count)
+        self._live_preview = QCheckBox("Preview", self)
+        self._live_preview.setToolTip("Show the image being sampled in a preview layer")
+        self._live_preview.setChecked(self._options.live_preview)
+        buttons.addWidget(self._live_preview)
         self._generate_button = QPushButton("Generate", self)
-        layout.addWidget(self._generate_button)
+        buttons.addWidget(self._generate_button, 1)
+        self._cancel_button = QPushButton("Cancel", self)
+        self._cancel_button.setEnabled(False)
+        buttons.addWidget(self._cancel_button)
+        layout.addLayout(buttons)
+
+        self._tile_parameters_widget = TileParametersWidget(self._tile_parameters)
+        layout.addWidget(self._tile_parameters_widget)
+        self._tiled_button = QPushButton("Tiled img2img", self)
+        self._tiled_button.setToolTip("Upscale the document, then refine it with img2img tile by tile")
+        self._inpaint_button = QPushButton("Inpaint", self)
+        self._inpaint_button.setToolTip("Inpaint the selection, or what changed on the active layer since the last "
+                                        "inpaint, sending only that region and its margin")
+        img2img_buttons = QHBoxLayout()
+        img2img_buttons.addWidget(self._tiled_button)
+        img2img_buttons.addWidget(self._inpaint_button)
+        layout.addLayout(img2img_buttons)
+
+        self._sweep_parameters_widget = SweepParametersWidget(self._sweep_parameters)
+        layout.addWidget(self._sweep_parameters_widget)
+        self._sweep_button = QPushButton("Sweep", self)
+        self._sweep_button.setToolTip("Generate a grid of seeds, CFG scales and {a|b} prompt alternatives, "
+                                      "with a contact sheet layer and the images in a hidden group")
+        layout.addWidget(self._sweep_button)
+
+        if tracer.enabled:
+            layout.addWidget(TracePanel(self))
 
         layout.addStretch(0)
 
         self.setLayout(layout)
 
     def _load_options(self):
-        try:
-            self._parameters.load()
-            self.status_updated.emit(Status.Loading, None)
-            self._common_parameters.update_model_options(self._client.get_models())
-            self._common_parameters.update_sampler_options(self._client.get_samplers())
-            self._common_parameters.populate_parameters()
+        """Fills the option lists from the cache right away and refreshes them from the API in the background"""
+        self._parameters.load()
+        self._tile_parameters.load()
+        self._tile_parameters_widget.populate_parameters()
+        self._sweep_parameters.load()
+        self._sweep_parameters_widget.populate_parameters()
+        self._control_net_parameters.load()
+        self._preset_bar.set_presets(store.presets())
+        models = self._options_cache.get(self._dispatcher.key, "models")
+        samplers = self._options_cache.get(self._dispatcher.key, "samplers")
+        self._common_parameters.update_model_options(models or [])
+        self._common_parameters.update_sampler_options(samplers or [])
+        self._common_parameters.populate_parameters()
+        self._control_net_parameters_widget.populate_parameters()
+        self._options_cold = models is None or samplers is None
+        self.status_updated.emit(Status.Loading if self._options_cold else Status.Ready, None)
+        self._pending_options = 2
+        dispatcher = self._dispatcher
+        for name, fetch, fetch_async in (("models", dispatcher.get_models, dispatcher.get_models_async),
+                                         ("samplers", dispatcher.get_samplers, dispatcher.get_samplers_async)):
+            self._start_fetch(name, fetch, fetch_async, self._on_options_loaded, self._on_options_error)
+
+    @pyqtSlot()
+    def _load_control_net_models(self):
+        """Only runs once ControlNet gets enabled, as the extension may not even be installed on the backends"""
+        models = self._options_cache.get(self._dispatcher.key, "control_net_models")
+        self._control_net_parameters_widget.update_model_options(models or [])
+        self._start_fetch("control_net_models", self._dispatcher.get_control_net_models,
+                          self._dispatcher.get_control_net_models_async, self._on_control_net_models_loaded,
+                          self._on_control_net_models_error)
+
+    @pyqtSlot(object)
+    def _on_control_net_models_loaded(self, result):
+        _, values = result
+        self._control_net_parameters_widget.update_model_options(values)
+
+    @pyqtSlot(Exception)
+    def _on_control_net_models_error(self, e: Exception):
+        qWarning(repr(e))
+        self.status_updated.emit(Status.Error, "Cannot list ControlNet models")
+
+    def _start_fetch(self, name, fetch, fetch_async, finished, error):
+        """Fetches an option list on the transport event loop when there is one, on a pool thread otherwise"""
+        if self._transport is not None:
+            signals = Signals(self)
+            for signal, slot in ((signals.finished, finished), (signals.error, error)):
+                signal.connect(slot)
+                signal.connect(self._release_fetch)
+            self._fetches.add(signals)
+            self._transport.run(self._fetch_options_async(name, fetch_async), signals)
+            return
+        task = GenerationTask(lambda: self._fetch_options(name, fetch))
+        task.signals.finished.connect(finished)
+        task.signals.error.connect(error)
+        self._thread_pool.start(task)
+
+    @pyqtSlot()
+    def _release_fetch(self):
+        signals = self.sender()
+        self._fetches.discard(signals)
+        signals.deleteLater()
+
+    async def _fetch_options_async(self, name, fetch):
+        values = await fetch()
+        # Writing the cache file would hold up every other request on the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self._options_cache.put, self._dispatcher.key, name,
+                                                         values)
+        return name, values
+
+    def _fetch_options(self, name, fetch):
+        values = fetch()
+        self._options_cache.put(self._dispatcher.key, name, values)
+        return name, values
+
+    @pyqtSlot(object)
+    def _on_options_loaded(self, result):
+        name, values = result
+        if name == "models":
+            self._common_parameters.update_model_options(values)
+        else:
+            self._common_parameters.update_sampler_options(values)
+        self._pending_options -= 1
+        if self._pending_options == 0 and self._options_cold:
+            self._options_cold = False
             self.status_updated.emit(Status.Ready, None)
-        except OSError as e:
-            qWarning(repr(e))
-            self.status_updated.emit(Status.Error, "Cannot connect to API")
+
+    @pyqtSlot(Exception)
+    def _on_options_error(self, e: Exception):
+        qWarning(repr(e))
+        self._pending_options -= 1
+        self.status_updated.emit(Status.Error, "Cannot connect to API")
 
     def _connect_ui(self):
         self._generate_button.clicked.connect(self._generate)
+        self._cancel_button.clicked.connect(self._cancel)
+        self._control_net_parameters_widget.models_requested.connect(self._load_control_net_models)
+        self._preset_bar.preset_selected.connect(self._apply_preset)
+        self._preset_bar.save_requested.connect(self._save_preset)
+        self._preset_bar.delete_requested.connect(self._delete_preset)
+        self._tiled_button.clicked.connect(self._generate_tiled)
+        self._sweep_button.clicked.connect(self._generate_sweep)
+        self._inpaint_button.clicked.connect(self._generate_inpaint)
+        self._queue.job_started.connect(self._on_task_started)
+        self._queue.image_ready.connect(self._on_image_ready)
+        self._inserter.error.connect(self._on_insert_error)
+        self._queue.job_finished.connect(self._on_job_finished)
+        self._queue.job_failed.connect(self._on_job_failed)
+        self._queue.stats_changed.connect(self._status_bar.update_queue)
+        self._progress_poller.progress_updated.connect(self._status_bar.update_progress)
+        self._progress_poller.preview_ready.connect(self._on_preview_ready)
+        self._live_preview.toggled.connect(self._on_live_preview_toggled)
         self.status_updated.connect(self._on_status_change)
         self.status_updated.connect(self._status_bar.update)
 
     def _generate(self):
-        if not Krita.instance().activeDocument():
+        document = Krita.instance().activeDocument()
+        if not document:
             QMessageBox.warning(QWidget(), "Warning", "No active document.")
             return
-        self._parameters.save()
-        task = GenerationTask(lambda: self._client.generate(self._parameters.as_dict()))
-        task.signals.started.connect(self._on_task_started)
-        task.signals.finished.connect(self._on_task_finished)
-        task.signals.error.connect(self._on_task_error)
-        self._thread_pool.start(task)
+        # Only recorded in memory, the settings file is written later by a timer thread
+        profile = document.fileName() or None
+        self._parameters.save(profile)
+        self._control_net_parameters.save(profile)
+        data = self._parameters.as_dict()
+        pixel_format = PixelFormat.of(document)
+        control, control_net, digest = None, None, None
+        if self._control_net_parameters.control_net_enabled:
+            node = document.activeNode()
+            if not node:
+                QMessageBox.warning(QWidget(), "Warning", "No active layer to use as the control map.")
+                return
+            # Pixels can only be read on the GUI thread, they are hashed once for all the jobs and encoded on a worker
+            control, control_net = read_control_layer(document, node), self._control_net_parameters.as_dict()
+            digest = self._control_images.digest(control)
+        self._failed = False
+        count = self._count.value()
+        batch = self._inserter.batch(document, data["prompt"], count * data["batch_size"] > 1)
+        jobs = self._queue.submit(seed_range(data, count), self._dispatcher.key,
+                                  lambda job_data, token: self._generate_images(job_data, pixel_format, token, control,
+                                                                                control_net, digest))
+        for job in jobs:
+            self._batches[job.id] = batch
+
+    def canvas_changed(self, canvas):
+        """Restores the parameters last used with the document now active, if any"""
+        document = Krita.instance().activeDocument()
+        profile = document and document.fileName()
+        if not profile or not store.has_profile(profile):
+            return
+        for section in (self._parameters, self._tile_parameters, self._control_net_parameters,
+                        self._sweep_parameters):
+            section.load(profile)
+        self._populate_parameters()
+
+    def _populate_parameters(self):
+        self._common_parameters.populate_parameters()
+        self._tile_parameters_widget.populate_parameters()
+        self._control_net_parameters_widget.populate_parameters()
+        self._sweep_parameters_widget.populate_parameters()
+
+    @pyqtSlot(str)
+    def _apply_preset(self, name: str):
+        values = store.preset(name)
+        if values is None:
+            return
+        for section in (self._parameters, self._tile_parameters, self._control_net_parameters,
+                        self._sweep_parameters):
+            section.apply(values)
+            section.save()
+        self._populate_parameters()
+
+    @pyqtSlot(str)
+    def _save_preset(self, name: str):
+        store.save_preset(name, {**self._parameters.as_dict(), **self._tile_parameters.as_dict(),
+                                 **self._control_net_parameters.as_dict(), **self._sweep_parameters.as_dict()})
+        self._preset_bar.set_presets(store.presets(), name)
+
+    @pyqtSlot(str)
+    def _delete_preset(self, name: str):
+        store.delete_preset(name)
+        self._preset_bar.set_presets(store.presets())
+
+    def _cancel(self):
+        """Stops the generations on the backends, and frees the workers waiting for them right away"""
+        busy = self._dispatcher.busy_backends()
+        if busy and self._transport is not None:
+            self._transport.submit(self._dispatcher.interrupt_async(busy))
+        elif busy:
+            self._thread_pool.start(GenerationTask(lambda: self._dispatcher.interrupt(busy)))
+        self._queue.cancel_all()
+        if self._tiled:
+            self._tiled.cancel()
+        if self._inpaint:
+            self._inpaint.cancel()
+
+    def _generate_tiled(self):
+        document = Krita.instance().activeDocument()
+        if not document:
+            QMessageBox.warning(QWidget(), "Warning", "No active document.")
+            return
+        profile = document.fileName() or None
+        self._parameters.save(profile)
+        self._tile_parameters.save(profile)
+        scale = self._tile_parameters.upscale
+        if scale > 1:
+            document.scaleImage(round(document.width() * scale), round(document.height() * scale),
+                                document.xRes(), document.yRes(), "Bicubic")
+            document.waitForDone()
+        data = {**self._parameters.as_dict(), "denoising_strength": self._tile_parameters.denoising_strength}
+        self._tiled = TiledImg2Img(self._dispatcher, document, data, self._tile_parameters.tile_size,
+                                   self._tile_parameters.tile_overlap,
+                                   self._options.max_in_flight * len(self._dispatcher.backends), self)
+        self._tiled.progress_updated.connect(self._status_bar.update_progress)
+        self._tiled.finished.connect(self._on_tiled_finished)
+        self._tiled.error.connect(self._on_tiled_error)
+        self._failed = False
+        self._tiled_button.setEnabled(False)
+        self._cancel_button.setEnabled(True)
+        self.status_updated.emit(Status.Processing, None)
+        self._tiled.start()
 
     @pyqtSlot()
-    def _on_task_started(self):
+    def _on_tiled_finished(self):
+        self._tiled = None
+        self._tiled_button.setEnabled(True)
+        self._on_job_done()
+
+    @pyqtSlot(Exception)
+    def _on_tiled_error(self, e: Exception):
+        qWarning(repr(e))
+        self._tiled = None
+        self._tiled_button.setEnabled(True)
+        self._failed = True
+        self.status_updated.emit(Status.Error, str(e))
+        self._on_job_done()
+
+    def _generate_inpaint(self):
+        document = Krita.instance().activeDocument()
+        if not document:
+            QMessageBox.warning(QWidget(), "Warning", "No active document.")
+            return
+        profile = document.fileName() or None
+        self._parameters.save(profile)
+        self._tile_parameters.save(profile)
+        data = {**self._parameters.as_dict(), "denoising_strength": self._tile_parameters.denoising_strength}
+        self._inpaint = Inpaint(self._dispatcher, document, data, self._change_tracker,
+                                self._tile_parameters.inpaint_margin, self._thread_pool, self)
+        self._inpaint.finished.connect(self._on_inpaint_finished)
+        self._inpaint.error.connect(self._on_inpaint_error)
+        self._failed = False
+        self._inpaint_button.setEnabled(False)
+        self._cancel_button.setEnabled(True)
         self.status_updated.emit(Status.Processing, None)
+        self._inpaint.start()
+
+    @pyqtSlot(str)
+    def _on_inpaint_finished(self, message: str):
+        self._inpaint = None
+        self._inpaint_button.setEnabled(True)
+        self._on_job_done()
+        if message:
+            QMessageBox.information(QWidget(), "Inpaint", message)
+
+    @pyqtSlot(Exception)
+    def _on_inpaint_error(self, e: Exception):
+        qWarning(repr(e))
+        self._inpaint = None
+        self._inpaint_button.setEnabled(True)
+        self._failed = True
+        self.status_updated.emit(Status.Error, str(e))
+        self._on_job_done()
 
-    @pyqtSlot(GenerationResponse)
-    def _on_task_finished(self, response: GenerationResponse):
+    def _generate_sweep(self):
+        document = Krita.instance().activeDocument()
+        if not document:
+            QMessageBox.warning(QWidget(), "Warning", "No active document.")
+            return
+        profile = document.fileName() or None
+        self._parameters.save(profile)
+        self._sweep_parameters.save(profile)
+        data = self._parameters.as_dict()
         try:
-            application = Krita.instance()
-            doc = application.activeDocument()
-            root = doc.rootNode()
-            prompt = response.parameters["prompt"]
-            qInfo(f"Image generated with {str(response.parameters)}")
-            for index, encoded in enumerate(response.images):
-                buffer = QByteArray.fromRawData(base64.b64decode(encoded))
-                image = QImage.fromData(buffer)
-                ptr = image.bits()
-                ptr.setsize(image.byteCount())
-                layer = doc.createNode("_".join(map(str, [prompt, index])), "paintlayer")
-                layer.setPixelData(QByteArray(ptr.asstring()), 0, 0, image.width(), image.height())
-                root.addChildNode(layer, None)
-            doc.refreshProjection()
-            self.status_updated.emit(Status.Ready, None)
+            seeds = parse_range(self._sweep_parameters.sweep_seeds, int)
+            cfg_scales = parse_range(self._sweep_parameters.sweep_cfg_scales, float)
+            if not seeds:
+                seed, count = data["seed"], self._count.value()
+                seeds = [-1] * count if seed == -1 else list(range(seed, seed + count))
+            cells = expand(data["prompt"], seeds, cfg_scales or [data["cfg_scale"]])
+        except ValueError as e:
+            QMessageBox.warning(QWidget(), "Warning", f"Invalid sweep range: {e}")
+            return
+        rows, columns = cells[-1].row + 1, cells[-1].column + 1
+        sheet = ContactSheet(document, f"Sweep: {data['prompt'][:40].strip()}", rows, columns, parent=self)
+        batch = self._inserter.batch(document, data["prompt"], True, hidden=True)
+        pixel_format = PixelFormat.of(document)
+        cell_size = (sheet.cell_width, sheet.cell_height)
+        self._failed = False
+        # Each packed request is a job of its own, bound to the cells its images fill
+        for request in pack(data, cells, self._sweep_parameters.sweep_max_batch):
+            jobs = self._queue.submit(
+                [request.data], self._dispatcher.key,
+                lambda job_data, token, request_cells=request.cells: self._generate_sweep_images(
+                    job_data, request_cells, pixel_format, cell_size, token))
+            for job in jobs:
+                self._batches[job.id] = batch
+                self._sheets[job.id] = sheet
+
+    def _generate_sweep_images(self, data, cells: List[SweepCell], pixel_format: PixelFormat, cell_size,
+                               token: CancellationToken):
+        """Decodes each image of a packed request for its hidden layer and as a thumbnail for its cell"""
+        images = self._encoded_images(data, token)
+        cells = iter(cells)
+        while True:
+            try:
+                image = next(images)
+            except StopIteration as stop:
+                return stop.value
+            cell = next(cells, None)
+            # Extra images, e.g. the grid some backends append, are not part of the sweep
+            if cell is not None:
+                yield SweepImage(cell, ingest(image, pixel_format, cell.name), thumbnail(image, *cell_size))
+
+    def _generate_images(self, data, pixel_format: PixelFormat, token: CancellationToken, control: ControlLayer = None,
+                         control_net: dict = None, digest: str = None):
+        """Decodes images on the worker thread as they arrive, leaving only layer insertion to the GUI thread"""
+        images = self._encoded_images(data, token, control, control_net, digest)
+        while True:
+            try:
+                image = next(images)
+            except StopIteration as stop:
+                return stop.value
+            yield ingest(image, pixel_format)
+
+    def _encoded_images(self, data, token: CancellationToken, control: ControlLayer = None, control_net: dict = None,
+                        digest: str = None):
+        """Yields the encoded images from the result cache or as they arrive from a backend.
+
+        The control layer is identified by `digest`, its hash taken once for all the jobs of a submit.
+        """
+        key_data = data
+        if control is not None:
+            digest = digest or self._control_images.digest(control)
+            key_data = with_control_net(data, control_net, digest)
+        key = self._result_cache.key(key_data, self._dispatcher.model_hash(data.get("sd_model")))
+        cached = self._result_cache.get(key)
+        if cached:
+            for image in cached:
+                token.raise_if_cancelled()
+                yield image
+            return GenerationResponse(images=[], parameters=data, info="")
+        if control is not None:
+            data = with_control_net(data, control_net, self._control_images.encode(control, digest))
+        with self._dispatcher.generate_stream(data, token=token) as stream, self._result_cache.writer(key) as writer:
+            for image in stream:
+                writer.add(image)
+                token.raise_if_cancelled()
+                yield image
+        return GenerationResponse(images=[], parameters=stream.parameters, info=stream.info)
+
+    @pyqtSlot(GenerationJob)
+    def _on_task_started(self, job: GenerationJob):
+        self._cancel_button.setEnabled(True)
+        self.status_updated.emit(Status.Processing, None)
+        self._preview_job = job
+        self._progress_poller.set_preview_size(
+            (job.data["width"], job.data["height"]) if self._options.live_preview else None)
+        self._progress_poller.start()
+
+    @pyqtSlot(bool)
+    def _on_live_preview_toggled(self, enabled: bool):
+        self._options.live_preview = enabled
+        self._options.save()
+        if not enabled:
+            self._progress_poller.set_preview_size(None)
+            self._preview.remove()
+
+    @pyqtSlot(object)
+    def _on_preview_ready(self, image: IngestedImage):
+        if self._queue.is_idle() or not self._options.live_preview:
+            return
+        # The document the job was submitted for, the user may have switched to another one since
+        batch = self._batches.get(self._preview_job.id) if self._preview_job else None
+        if batch is None:
+            return
+        try:
+            self._preview.update(batch.document, image)
         except Exception as e:
             qWarning(repr(e))
-            self.status_updated.emit(Status.Error, str(e))
 
-    @pyqtSlot(Status)
-    @pyqtSlot(Status, str)
-    def _on_status_change(self, status: Status):
-        self._generate_button.setEnabled(status == Status.Ready or status == Status.Error)
+    @pyqtSlot(GenerationJob, object)
+    def _on_image_ready(self, job: GenerationJob, image: IngestedImage):
+        """Queues the layer, the inserter adds it in a later event loop tick and refreshes the projection"""
+        self._preview.remove()
+        if isinstance(image, SweepImage):
+            try:
+                self._sheets[job.id].add(image.cell, image.thumbnail)
+            except Exception as e:
+                self._on_insert_error(e)
+            image = image.image
+        self._inserter.add(self._batches[job.id], image)
 
     @pyqtSlot(Exception)
-    def _on_task_error(self, e: Exception):
+    def _on_insert_error(self, e: Exception):
         qWarning(repr(e))
         self.status_updated.emit(Status.Error, str(e))
 
+    @pyqtSlot(GenerationJob, object)
+    def _on_job_finished(self, job: GenerationJob, response: GenerationResponse):
+        qInfo(f"Image generated with {str(response.parameters)}")
+        self._batches.pop(job.id, None)
+        self._sheets.pop(job.id, None)
+        self._on_job_done()
 
-class ImageGeneration(DockWidget):
-    id: ClassVar[str] = "image_generation"
+    @pyqtSlot(GenerationJob, Exception)
+    def _on_job_failed(self, job: GenerationJob, e: Exception):
+        self._batches.pop(job.id, None)
+        self._sheets.pop(job.id, None)
+        if not isinstance(e, Cancelled):
+            qWarning(repr(e))
+            self._failed = True
+            self.status_updated.emit(Status.Error, str(e))
+        self._on_job_done()
 
-    def __init__(self):
-        super().__init__()
-        self.setWidget(_Widget())
+    def _on_job_done(self):
+        if not self._queue.is_idle() or self._tiled or self._inpaint:
+            return
+        self._progress_poller.stop()
+        self._preview.remove()
+        # Jobs cancelled before they started never report back
+        self._batches.clear()
+        self._sheets.clear()
+        self._cancel_button.setEnabled(False)
+        if not self._failed:
+            self.status_updated.emit(Status.Ready, None)
+
+    @pyqtSlot(Status)
+    @pyqtSlot(Status, str)
+    def _on_status_change(self, status: Status):
+        self._generate_button.setEnabled(status != Status.Loading)
+        self._tiled_button.setEnabled(status != Status.Loading and not self._tiled)
+        self._sweep_button.setEnabled(status != Status.Loading)
+        self._inpaint_button.setEnabled(status != Status.Loading and not self._inpaint)
 
-    def canvasChanged(self, canvas):
-        pass
@@ -0,0 +1,100 @@
+import base64
+from dataclasses import dataclass
+
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice
+from PyQt5.QtGui import QImage
+
+from arcane_illusion.tracing import span
+
+_SRGB_PROFILE = "sRGB-elle-V2-srgbtrc.icc"
+
+
+@dataclass(frozen=True)
+class PixelFormat:
+    color_model: str
+    color_depth: str
+    color_profile: str
+
+    @staticmethod
+    def of(document) -> "PixelFormat":
+        return PixelFormat(document.colorModel(), document.colorDepth(), document.colorProfile())
+
+
+# Pixel layouts QImage can produce directly, Krita stores RGBA as BGRA in memory
+_RGBA_U8 = PixelFormat("RGBA", "U8", _SRGB_PROFILE)
+_RGBA_U16 = PixelFormat("RGBA", "U16", _SRGB_PROFILE)
+
+
+@dataclass()
+class IngestedImage:
+    """Decoded image whose pixels are laid out for `Node.setPixelData` in `pixel_format`"""
+    name: str
+    width: int
+    height: int
+    pixels: bytes
+    pixel_format: PixelFormat
+
+
+def ingest(data, target: PixelFormat, name: str = "") -> IngestedImage:
+    """Decodes an encoded image once and lays its pixels out for the target format, safe to call off the GUI thread.
+
+    Formats QImage cannot produce fall back to 8-bit sRGB and are converted by Krita on insertion.
+    """
+    with span("decode.png"):
+        image = QImage.fromData(data)
+    if image.isNull():
+        raise ValueError("Cannot decode generated image")
+    with span("convert", color_model=target.color_model, color_depth=target.color_depth):
+        if target == _RGBA_U16:
+            image = image.convertToFormat(QImage.Format_RGBA64).rgbSwapped()
+            pixel_format = _RGBA_U16
+        else:
+            image = image.convertToFormat(QImage.Format_ARGB32)
+            pixel_format = _RGBA_U8
+        bits = image.constBits()
+        bits.setsize(image.bytesPerLine() * image.height())
+        pixels = bits.asstring()
+    return IngestedImage(name, image.width(), image.height(), pixels, pixel_format)
+
+
+def encode_png(image: QImage) -> str:
+    """Base64 PNG of the image as the API expects it in requests"""
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "PNG")
+    buffer.close()
+    return base64.b64encode(bytes(data)).decode("ascii")
+
+
+def read_region(document, x: int, y: int, width: int, height: int) -> bytes:
+    """8-bit BGRA pixels of the merged image in the region, must be called on the GUI thread.
+
+    Other formats are converted through a detached layer holding only the region, so the cost follows its size rather
+    than the document's.
+    """
+    with span("read_region", width=width, height=height):
+        pixels = document.pixelData(x, y, width, height)
+        if PixelFormat.of(document) == _RGBA_U8:
+            return bytes(pixels)
+        layer = document.createNode("region", "paintlayer")
+        layer.setPixelData(pixels, 0, 0, width, height)
+        layer.setColorSpace(_RGBA_U8.color_model, _RGBA_U8.color_depth, _RGBA_U8.color_profile)
+        return bytes(layer.pixelData(0, 0, width, height))
+
+
+def insert_layer(document, image: IngestedImage, parent=None):
+    """Creates a paint layer holding the image, must be called on the GUI thread"""
+    target = PixelFormat.of(document)
+    with span("layer.create"):
+        layer = document.createNode(image.name, "paintlayer")
+        (parent or document.rootNode()).addChildNode(layer, None)
+    if image.pixel_format != target:
+        layer.setColorSpace(image.pixel_format.color_model, image.pixel_format.color_depth,
+                            image.pixel_format.color_profile)
+    with span("layer.set_pixel_data", width=image.width, height=image.height):
+        layer.setPixelData(QByteArray.fromRawData(image.pixels), 0, 0, image.width, image.height)
+    if image.pixel_format != target:
+        with span("layer.convert"):
+            layer.setColorSpace(target.color_model, target.color_depth, target.color_profile)
+    return layer
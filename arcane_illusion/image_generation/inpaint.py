@@ -0,0 +1,221 @@
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from PyQt5.QtCore import QByteArray, QObject, QThreadPool, Qt, pyqtSignal, pyqtSlot
+from PyQt5.QtGui import QColor, QImage, QPainter
+
+from arcane_illusion.tracing import span
+from .cancellation import CancellationToken, Cancelled
+from .dispatcher import Dispatcher
+from .generation_task import GenerationTask
+from .image_ingest import PixelFormat, encode_png, read_region
+from .tiling import Tile
+
+_RGBA_U8 = PixelFormat("RGBA", "U8", "sRGB-elle-V2-srgbtrc.icc")
+
+
+def bounding_box(tiles: List[Tile]) -> Tile:
+    x, y = min(tile.x for tile in tiles), min(tile.y for tile in tiles)
+    right = max(tile.x + tile.width for tile in tiles)
+    bottom = max(tile.y + tile.height for tile in tiles)
+    return Tile(x, y, right - x, bottom - y)
+
+
+def _pad(start: int, length: int, limit: int, margin: int, multiple: int) -> Tuple[int, int]:
+    start, end = max(0, start - margin), min(limit, start + length + margin)
+    missing = -(end - start) % multiple
+    grow = min(missing, limit - end)
+    end += grow
+    start -= min(missing - grow, start)
+    return start, end
+
+
+def pad_region(bounds: Tile, margin: int, width: int, height: int, multiple: int = 8) -> Tile:
+    """Grows the bounds by the context margin and to a multiple of 8 pixels, as far as the canvas allows"""
+    x, right = _pad(bounds.x, bounds.width, width, margin, multiple)
+    y, bottom = _pad(bounds.y, bounds.height, height, margin, multiple)
+    return Tile(x, y, right - x, bottom - y)
+
+
+@dataclass()
+class LayerSnapshot:
+    """Hashes of the tiles of a layer, in row order"""
+    key: str
+    width: int
+    height: int
+    grid: List[bytes] = field(repr=False)
+
+
+class ChangeTracker:
+    """Finds the parts of a layer painted since it was last recorded, as a grid of tile hashes.
+
+    Only the hashes are kept, a few bytes per tile, and comparing two grids tells which tiles changed without keeping
+    a copy of the pixels around. Safe to call off the GUI thread.
+    """
+
+    def __init__(self, tile_size: int = 64) -> None:
+        super().__init__()
+        self._tile_size = tile_size
+        self._lock = threading.Lock()
+        self._snapshots: Dict[str, LayerSnapshot] = {}
+
+    def tiles(self, width: int, height: int) -> List[Tile]:
+        size = self._tile_size
+        return [Tile(x, y, min(size, width - x), min(size, height - y))
+                for y in range(0, height, size)
+                for x in range(0, width, size)]
+
+    def compare(self, key: str, pixels: bytes, width: int, height: int) -> Tuple[Optional[List[Tile]], LayerSnapshot]:
+        """The tiles that changed since the layer was last recorded, None if it never was, and its current snapshot.
+
+        Nothing is recorded here, the snapshot is only meant to be recorded once the changes have been dealt with.
+        """
+        tiles = self.tiles(width, height)
+        with span("inpaint.hash", tiles=len(tiles)):
+            pixel_size = len(pixels) // (width * height)
+            stride = width * pixel_size
+            view = memoryview(pixels)
+            grid = []
+            for tile in tiles:
+                h = hashlib.blake2b(digest_size=8)
+                start, end = tile.x * pixel_size, (tile.x + tile.width) * pixel_size
+                for row in range(tile.y, tile.y + tile.height):
+                    h.update(view[row * stride + start:row * stride + end])
+                grid.append(h.digest())
+        snapshot = LayerSnapshot(key, width, height, grid)
+        with self._lock:
+            previous = self._snapshots.get(key)
+        if previous is None or (previous.width, previous.height) != (width, height):
+            return None, snapshot
+        return [tile for tile, old, new in zip(tiles, previous.grid, grid) if old != new], snapshot
+
+    def record(self, snapshot: LayerSnapshot):
+        with self._lock:
+            self._snapshots[snapshot.key] = snapshot
+
+
+class Inpaint(QObject):
+    """Inpaints only the part of the canvas being worked on.
+
+    The region is the selection when there is one, otherwise the tiles of the active layer that changed since the
+    previous inpaint. It is padded with some context, cropped from the canvas and sent to img2img with a mask, and the
+    result is placed back at the same position in a new layer. What is uploaded scales with the edited area.
+    """
+    # Empty once the result is in place, otherwise why nothing was generated
+    finished = pyqtSignal(str)
+    error = pyqtSignal(Exception)
+
+    def __init__(self, dispatcher: Dispatcher, document, data: dict, tracker: ChangeTracker, margin: int = 64,
+                 thread_pool: QThreadPool = None, parent=None):
+        super().__init__(parent)
+        self._thread_pool = thread_pool or QThreadPool(self)
+        self._dispatcher = dispatcher
+        self._document = document
+        self._data = data
+        self._tracker = tracker
+        self._margin = margin
+        self._token = CancellationToken()
+        self._snapshot: Optional[LayerSnapshot] = None
+
+    def start(self):
+        document = self._document
+        selection = document.selection()
+        if selection is not None and selection.width() > 0 and selection.height() > 0:
+            bounds = Tile(selection.x(), selection.y(), selection.width(), selection.height())
+            region = pad_region(bounds, self._margin, document.width(), document.height())
+            with span("inpaint.read_mask"):
+                mask = QImage(bytes(selection.pixelData(region.x, region.y, region.width, region.height)),
+                              region.width, region.height, region.width, QImage.Format_Grayscale8).copy()
+            self._send(region, mask)
+            return
+        node = document.activeNode()
+        if node is None:
+            self.finished.emit("No selection or active layer to inpaint")
+            return
+        width, height = document.width(), document.height()
+        with span("inpaint.read_layer"):
+            pixels = bytes(node.pixelData(0, 0, width, height))
+        key = node.uniqueId().toString()
+        self._start(lambda: self._tracker.compare(key, pixels, width, height), self._on_changes)
+
+    def cancel(self):
+        self._token.cancel()
+
+    def _start(self, task, finished):
+        task = GenerationTask(task)
+        task.signals.finished.connect(finished)
+        task.signals.error.connect(self._on_error)
+        self._thread_pool.start(task)
+
+    @pyqtSlot(object)
+    def _on_changes(self, changes: Tuple[Optional[List[Tile]], LayerSnapshot]):
+        tiles, snapshot = changes
+        if tiles is None:
+            self._tracker.record(snapshot)
+            self.finished.emit("Changes to the active layer are tracked from now on, paint and inpaint again")
+            return
+        if not tiles:
+            self.finished.emit("Nothing changed on the active layer since the last inpaint")
+            return
+        # Recorded once the result is in place, so the edits are still found after a failed or cancelled run
+        self._snapshot = snapshot
+        document = self._document
+        region = pad_region(bounding_box(tiles), self._margin, document.width(), document.height())
+        mask = QImage(region.width, region.height, QImage.Format_Grayscale8)
+        mask.fill(QColor(0, 0, 0))
+        painter = QPainter(mask)
+        for tile in tiles:
+            painter.fillRect(tile.x - region.x, tile.y - region.y, tile.width, tile.height, QColor(255, 255, 255))
+        painter.end()
+        self._send(region, mask)
+
+    def _send(self, region: Tile, mask: QImage):
+        pixels = read_region(self._document, region.x, region.y, region.width, region.height)
+        self._start(lambda: self._process(region, pixels, mask), self._on_result)
+
+    def _process(self, region: Tile, pixels: bytes, mask: QImage) -> Tuple[Tile, bytes]:
+        """Encodes the crop and its mask, sends them and decodes the result on a worker thread"""
+        with span("inpaint.encode", width=region.width, height=region.height):
+            image = QImage(pixels, region.width, region.height, QImage.Format_ARGB32)
+            # The backend pastes the original back outside the blurred mask, so the crop blends in once placed
+            data = {**self._data, "init_images": [encode_png(image)], "mask": encode_png(mask),
+                    "mask_blur": 8, "inpainting_fill": 1, "inpaint_full_res": False,
+                    "width": region.width, "height": region.height, "batch_size": 1, "n_iter": 1}
+        with self._dispatcher.generate_stream(data, "img2img", self._token) as stream:
+            encoded = next(iter(stream))
+        with span("inpaint.decode"):
+            result = QImage.fromData(encoded)
+            if result.isNull():
+                raise ValueError("Cannot decode inpainted image")
+            if result.width() != region.width or result.height() != region.height:
+                result = result.scaled(region.width, region.height, transformMode=Qt.SmoothTransformation)
+            result = result.convertToFormat(QImage.Format_ARGB32)
+            bits = result.constBits()
+            bits.setsize(result.bytesPerLine() * result.height())
+            return region, bits.asstring()
+
+    @pyqtSlot(object)
+    def _on_result(self, result: Tuple[Tile, bytes]):
+        region, pixels = result
+        document = self._document
+        with span("inpaint.composite"):
+            layer = document.createNode(f"{self._data['prompt'][:40]} (inpaint)", "paintlayer")
+            document.rootNode().addChildNode(layer, None)
+            layer.setColorSpace(_RGBA_U8.color_model, _RGBA_U8.color_depth, _RGBA_U8.color_profile)
+            layer.setPixelData(QByteArray(pixels), region.x, region.y, region.width, region.height)
+            target = PixelFormat.of(document)
+            if target != _RGBA_U8:
+                layer.setColorSpace(target.color_model, target.color_depth, target.color_profile)
+        document.refreshProjection()
+        if self._snapshot is not None:
+            self._tracker.record(self._snapshot)
+        self.finished.emit("")
+
+    @pyqtSlot(Exception)
+    def _on_error(self, e: Exception):
+        if isinstance(e, Cancelled):
+            self.finished.emit("Inpainting cancelled")
+        else:
+            self.error.emit(e)
@@ -0,0 +1,91 @@
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, List, Tuple
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from arcane_illusion.tracing import span
+from .image_ingest import IngestedImage, insert_layer
+
+
+@dataclass()
+class LayerBatch:
+    """Images of one submission, named after a prefix computed once and grouped when there are several"""
+    document: object = field(repr=False)
+    prefix: str
+    grouped: bool
+    hidden: bool = False
+    group: object = field(default=None, repr=False)
+    count: int = 0
+
+
+class LayerInserter(QObject):
+    """Inserts decoded images as layers on the GUI thread without freezing it.
+
+    Images are queued and inserted in chunks taking at most `budget` seconds per event loop tick, and the projection
+    of the touched documents is refreshed at most every `refresh_interval` milliseconds.
+    """
+    error = pyqtSignal(Exception)
+
+    def __init__(self, budget: float = 0.008, refresh_interval: int = 250, parent=None):
+        super().__init__(parent)
+        self._budget = budget
+        self._pending: Deque[Tuple[LayerBatch, IngestedImage]] = deque()
+        self._dirty: List[object] = []
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._insert_chunk)
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(refresh_interval)
+        self._refresh_timer.timeout.connect(self._refresh)
+
+    @staticmethod
+    def batch(document, prompt: str, grouped: bool, hidden: bool = False) -> LayerBatch:
+        return LayerBatch(document, prompt[:40].strip() or "Generated", grouped, hidden)
+
+    def add(self, batch: LayerBatch, image: IngestedImage):
+        self._pending.append((batch, image))
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def is_idle(self) -> bool:
+        return not self._pending
+
+    def _insert_chunk(self):
+        deadline = time.perf_counter() + self._budget
+        with span("layer.insert_chunk") as chunk_span:
+            inserted = 0
+            while self._pending and (not inserted or time.perf_counter() < deadline):
+                batch, image = self._pending.popleft()
+                inserted += 1
+                try:
+                    self._insert(batch, image)
+                except Exception as e:
+                    self.error.emit(e)
+            chunk_span.set(layers=inserted)
+        if not self._pending:
+            self._timer.stop()
+        if not self._refresh_timer.isActive():
+            self._refresh_timer.start()
+
+    def _insert(self, batch: LayerBatch, image: IngestedImage):
+        document = batch.document
+        if batch.grouped and batch.group is None:
+            batch.group = document.createGroupLayer(batch.prefix)
+            document.rootNode().addChildNode(batch.group, None)
+        batch.count += 1
+        if not image.name:
+            image.name = f"{batch.prefix} {batch.count}"
+        layer = insert_layer(document, image, batch.group)
+        if batch.hidden:
+            layer.setVisible(False)
+        if document not in self._dirty:
+            self._dirty.append(document)
+
+    def _refresh(self):
+        dirty, self._dirty = self._dirty, []
+        with span("refresh_projection", documents=len(dirty)):
+            for document in dirty:
+                document.refreshProjection()
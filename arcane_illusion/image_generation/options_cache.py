@@ -0,0 +1,47 @@
+import json
+import os
+import threading
+import time
+from typing import List, Optional
+
+from PyQt5.QtCore import QStandardPaths
+
+from arcane_illusion.constants import EXTENSION_ID
+
+
+class OptionsCache:
+    """On-disk cache of the option lists last fetched from each backend"""
+
+    def __init__(self, path: str = None) -> None:
+        super().__init__()
+        self._path = path or os.path.join(QStandardPaths.writableLocation(QStandardPaths.CacheLocation),
+                                          EXTENSION_ID, "options.json")
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def get(self, url: str, name: str) -> Optional[List[str]]:
+        with self._lock:
+            entry = self._load().get(url, {}).get(name)
+        return entry and entry["values"]
+
+    def put(self, url: str, name: str, values: List[str]):
+        with self._lock:
+            entries = self._load()
+            entries.setdefault(url, {})[name] = {"values": values, "timestamp": time.time()}
+            self._write(entries)
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            try:
+                with open(self._path, encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _write(self, entries: dict):
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        temporary = f"{self._path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(temporary, self._path)
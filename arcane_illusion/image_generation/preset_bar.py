@@ -0,0 +1,51 @@
+from typing import List
+
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QComboBox, QInputDialog, QLineEdit, QPushButton
+
+
+class PresetBar(QWidget):
+    preset_selected = pyqtSignal(str)
+    save_requested = pyqtSignal(str)
+    delete_requested = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._build()
+        self._connect()
+
+    def _build(self):
+        layout = QHBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self._presets = QComboBox()
+        self._presets.setToolTip("Saved parameter presets")
+        layout.addWidget(self._presets, 1)
+        self._save = QPushButton("Save")
+        self._save.setToolTip("Save the current parameters as a preset")
+        layout.addWidget(self._save)
+        self._delete = QPushButton("Delete")
+        layout.addWidget(self._delete)
+        self.setLayout(layout)
+
+    def _connect(self):
+        self._presets.activated[str].connect(self.preset_selected)
+        self._save.clicked.connect(self._on_save)
+        self._delete.clicked.connect(self._on_delete)
+
+    def set_presets(self, names: List[str], current: str = None):
+        self._presets.blockSignals(True)
+        self._presets.clear()
+        self._presets.addItems(names)
+        self._presets.setCurrentIndex(names.index(current) if current in names else -1)
+        self._presets.blockSignals(False)
+        self._delete.setEnabled(bool(names))
+
+    def _on_save(self):
+        name, accepted = QInputDialog.getText(self, "Save Preset", "Name", QLineEdit.Normal,
+                                              self._presets.currentText())
+        if accepted and name.strip():
+            self.save_requested.emit(name.strip())
+
+    def _on_delete(self):
+        if self._presets.currentIndex() >= 0:
+            self.delete_requested.emit(self._presets.currentText())
@@ -0,0 +1,81 @@
+import base64
+from typing import Optional
+
+from PyQt5.QtCore import QByteArray, QRect, QTimer
+from PyQt5.QtGui import QImage, QPainter
+
+from arcane_illusion.tracing import span
+from .image_ingest import IngestedImage, PixelFormat
+
+_RGBA_U8 = PixelFormat("RGBA", "U8", "sRGB-elle-V2-srgbtrc.icc")
+
+
+class PreviewDecoder:
+    """Decodes sampling previews scaled to the size of the final image, off the GUI thread.
+
+    Every frame is painted, scaled and converted at once, into the same canvas, which is only reallocated when the
+    size changes. The pixels emitted are the one copy made per frame, as the GUI thread reads them while the next
+    frame is decoded. Not thread safe, meant to be owned by the polling thread.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._canvas: Optional[QImage] = None
+
+    def decode(self, encoded: str, width: int, height: int) -> Optional[IngestedImage]:
+        with span("preview.decode"):
+            image = QImage.fromData(base64.b64decode(encoded))
+            if image.isNull():
+                return None
+            canvas = self._canvas
+            if canvas is None or canvas.width() != width or canvas.height() != height:
+                canvas = self._canvas = QImage(width, height, QImage.Format_ARGB32)
+            painter = QPainter(canvas)
+            painter.setCompositionMode(QPainter.CompositionMode_Source)
+            painter.drawImage(QRect(0, 0, width, height), image)
+            painter.end()
+            bits = canvas.constBits()
+            bits.setsize(canvas.bytesPerLine() * height)
+            return IngestedImage("Preview", width, height, bits.asstring(), _RGBA_U8)
+
+
+class PreviewLayer:
+    """Single layer showing the image being sampled, whose pixels are replaced in place on every preview.
+
+    The projection is refreshed at most every `refresh_interval` milliseconds however often previews arrive.
+    """
+
+    def __init__(self, refresh_interval: int = 250, parent=None) -> None:
+        super().__init__()
+        self._document = None
+        self._node = None
+        self._timer = QTimer(parent)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(refresh_interval)
+        self._timer.timeout.connect(self._refresh)
+
+    def update(self, document, image: IngestedImage):
+        if self._node is None or self._document != document:
+            self.remove()
+            self._document = document
+            self._node = document.createNode(image.name, "paintlayer")
+            document.rootNode().addChildNode(self._node, None)
+            if PixelFormat.of(document) != _RGBA_U8:
+                self._node.setColorSpace(_RGBA_U8.color_model, _RGBA_U8.color_depth, _RGBA_U8.color_profile)
+        with span("preview.set_pixel_data"):
+            self._node.setPixelData(QByteArray.fromRawData(image.pixels), 0, 0, image.width, image.height)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def remove(self):
+        self._timer.stop()
+        if self._node is not None:
+            self._node.remove()
+            self._document.refreshProjection()
+        self._node = None
+        self._document = None
+
+    def _refresh(self):
+        if self._document is not None:
+            with span("preview.refresh_projection"):
+                self._document.refreshProjection()
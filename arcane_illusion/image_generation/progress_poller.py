@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PyQt5.QtCore import QObject, pyqtSignal, qWarning
+
+from arcane_illusion.image_generation.async_transport import AsyncTransport
+from arcane_illusion.image_generation.client import Client
+from arcane_illusion.image_generation.connection_pool import ConnectionPool
+from arcane_illusion.image_generation.preview_layer import PreviewDecoder
+
+
+class ProgressPoller(QObject):
+    """Polls the progress of the busy backends from a single background thread over its own connections.
+
+    The polling interval shortens while the progress moves and backs off while it stalls, and updates are only
+    emitted when they changed noticeably and at most every `min_emit_interval` seconds. Once a preview size is set,
+    the image being sampled on the first busy backend is fetched at most every `preview_interval` seconds, decoded
+    here and emitted only when it changed.
+
+    With a transport, the busy backends are polled all at once on its event loop instead of one after the other.
+    """
+    progress_updated = pyqtSignal(float, float)
+    preview_ready = pyqtSignal(object)
+    # Progress requests are answered right away, a slow one should not hold the next polls back
+    _timeout = (5.0, 5.0)
+
+    def __init__(self, urls: Callable[[], List[str]], min_interval: float = 0.25, max_interval: float = 2.0,
+                 min_emit_interval: float = 0.2, preview_interval: float = 1.0, transport: AsyncTransport = None,
+                 parent=None):
+        super().__init__(parent)
+        self._urls = urls
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._min_emit_interval = min_emit_interval
+        self._preview_interval = preview_interval
+        self._preview_size: Optional[Tuple[int, int]] = None
+        self._preview_at = 0.0
+        self._last_preview = None
+        self._preview_decoder = PreviewDecoder()
+        self._pool = ConnectionPool(max_per_host=1)
+        self._transport = transport
+        self._clients: Dict[str, Client] = {}
+        self._wake = threading.Event()
+        self._generation = 0
+        self._active = False
+
+    def start(self):
+        if self._active:
+            return
+        self._active = True
+        self._generation += 1
+        self._wake.clear()
+        threading.Thread(target=self._run, args=(self._generation,), name="progress-poller", daemon=True).start()
+
+    def set_preview_size(self, size: Optional[Tuple[int, int]]):
+        """Size to scale previews to, None stops fetching them"""
+        self._preview_size = size
+
+    def stop(self):
+        self._active = False
+        self._generation += 1
+        self._wake.set()
+
+    def _run(self, generation: int):
+        interval = self._min_interval
+        last = (-1.0, -1.0)
+        emitted_at = 0.0
+        while generation == self._generation:
+            progress = self._poll(generation)
+            if progress is not None:
+                changed = abs(progress[0] - last[0]) >= 0.01 or abs(progress[1] - last[1]) >= 1
+                interval = max(self._min_interval, interval / 2) if changed else min(self._max_interval, interval * 1.5)
+                now = time.monotonic()
+                if changed and now - emitted_at >= self._min_emit_interval and generation == self._generation:
+                    self.progress_updated.emit(*progress)
+                    last = progress
+                    emitted_at = now
+            else:
+                interval = self._max_interval
+            self._wake.wait(interval)
+
+    def _poll(self, generation: int):
+        responses = []
+        preview_size = self._preview_size
+        now = time.monotonic()
+        with_preview = preview_size is not None and now - self._preview_at >= self._preview_interval
+        clients = [self._client(url) for url in self._urls()]
+        # Only the first backend is asked for its preview
+        if self._transport is not None:
+            results = self._transport.call(self._progress_async(clients, with_preview))
+        else:
+            results = [self._progress(client, with_preview and not i) for i, client in enumerate(clients)]
+        for i, result in enumerate(results):
+            if isinstance(result, (OSError, ValueError)):
+                qWarning(repr(result))
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            if with_preview and not i:
+                self._preview_at = now
+                self._emit_preview(result.current_image, preview_size, generation)
+            responses.append(result)
+        if not responses:
+            return None
+        return (sum(response.progress for response in responses) / len(responses),
+                max(response.eta_relative for response in responses))
+
+    def _client(self, url: str) -> Client:
+        if url not in self._clients:
+            self._clients[url] = Client(url, self._pool, self._timeout, self._transport)
+        return self._clients[url]
+
+    @staticmethod
+    def _progress(client: Client, current_image: bool):
+        try:
+            return client.progress(current_image)
+        except (OSError, ValueError) as e:
+            return e
+
+    @staticmethod
+    async def _progress_async(clients: List[Client], with_preview: bool):
+        requests = (client.progress_async(with_preview and not i) for i, client in enumerate(clients))
+        return await asyncio.gather(*requests, return_exceptions=True)
+
+    def _emit_preview(self, encoded: Optional[str], size: Tuple[int, int], generation: int):
+        if not encoded or encoded == self._last_preview:
+            return
+        self._last_preview = encoded
+        preview = self._preview_decoder.decode(encoded, *size)
+        if preview is not None and generation == self._generation:
+            self.preview_ready.emit(preview)
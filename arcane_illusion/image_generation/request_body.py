@@ -0,0 +1,204 @@
+import hashlib
+import json
+import re
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Iterator, List, Union
+
+from arcane_illusion.tracing import span
+
+_BASE64 = re.compile(r"[A-Za-z0-9+/=]*")
+# Gzip header without a name or time, for deflate data from an unknown OS
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+
+class _Blob:
+    """Long base64 string of the payload, written in slices as JSON needs no escaping for it"""
+    __slots__ = ("text",)
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+
+class BlobCache:
+    """Raw deflate blocks of the images last uploaded, keyed by a hash of their base64 text.
+
+    Hashing is much cheaper than compressing, so sending the same control or init image again, to the same backend or
+    another one, reuses its compressed bytes. The blocks kept add up to at most `max_bytes`, the least recently used
+    are dropped first.
+    """
+
+    def __init__(self, max_entries: int = 8, max_bytes: int = 32 << 20) -> None:
+        super().__init__()
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: bytes):
+        with self._lock:
+            block = self._entries.get(digest)
+            if block is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return block
+
+    def put(self, digest: bytes, block: bytes):
+        if len(block) > self._max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(digest, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[digest] = block
+            self._size += len(block)
+            while len(self._entries) > self._max_entries or self._size > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+shared_blobs = BlobCache()
+
+
+class _GzipStream:
+    """Single gzip stream written in pieces, into which deflate blocks compressed elsewhere can be spliced.
+
+    Every piece ends with a full flush, which byte-aligns the output and drops the history, so the next piece never
+    refers back across it. A block compressed on its own from a fresh compressor and full flushed can therefore go
+    between any two pieces, and one decoder reads the result as a single stream.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        self._crc = 0
+        self._size = 0
+
+    def add(self, data: bytes) -> bytes:
+        """Compresses data of the body"""
+        self.count(data)
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FULL_FLUSH)
+
+    def count(self, data: bytes):
+        """Accounts for data of the body sent as a spliced block"""
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH) + struct.pack("<II", self._crc, self._size & 0xFFFFFFFF)
+
+
+class RequestBody:
+    """JSON body of an API request, produced chunk by chunk instead of as one string.
+
+    Iterating yields the encoded bytes, which http.client and the asyncio transport send with chunked transfer
+    encoding. Base64 strings longer than `inline_limit`, the images, are written in slices of `chunk_size`, so besides
+    the payload itself at most a chunk is held at a time. The body can be iterated again to retry a request.
+
+    When compressed, the body is a single gzip stream. Each image is compressed as deflate blocks of its own, taken
+    from the blob cache when the same image was uploaded recently, and spliced into the stream.
+    """
+
+    def __init__(self, data: dict, compress: bool = False, blobs: BlobCache = shared_blobs,
+                 chunk_size: int = 1 << 16, inline_limit: int = 4096) -> None:
+        super().__init__()
+        self._data = data
+        self._compress = compress
+        self._blobs = blobs
+        self._chunk_size = chunk_size
+        self._inline_limit = inline_limit
+
+    def __iter__(self) -> Iterator[bytes]:
+        with span("request.body", compress=self._compress) as body_span:
+            size = 0
+            for chunk in self._chunks():
+                size += len(chunk)
+                yield chunk
+            body_span.set(size=size)
+
+    def _chunks(self) -> Iterator[bytes]:
+        stream = _GzipStream() if self._compress else None
+        if stream is not None:
+            yield _GZIP_HEADER
+        for part in self._pieces():
+            if isinstance(part, _Blob):
+                yield from (self._compressed_blob(part.text, stream) if stream else self._slices(part.text))
+            else:
+                yield stream.add(part) if stream else part
+        if stream is not None:
+            yield stream.finish()
+
+    def _pieces(self) -> Iterator[Union[bytes, _Blob]]:
+        """The JSON text around the blobs joined in pieces of about `chunk_size`, and the blobs"""
+        glue: List[str] = []
+        glue_size = 0
+        for part in self._parts(self._data):
+            if isinstance(part, _Blob):
+                if glue:
+                    yield "".join(glue).encode("utf-8")
+                    glue, glue_size = [], 0
+                yield part
+                continue
+            glue.append(part)
+            glue_size += len(part)
+            if glue_size >= self._chunk_size:
+                yield "".join(glue).encode("utf-8")
+                glue, glue_size = [], 0
+        if glue:
+            yield "".join(glue).encode("utf-8")
+
+    def _parts(self, value) -> Iterator[Union[str, _Blob]]:
+        if isinstance(value, dict):
+            yield "{"
+            for i, (key, item) in enumerate(value.items()):
+                yield f'{", " if i else ""}{json.dumps(str(key))}: '
+                yield from self._parts(item)
+            yield "}"
+        elif isinstance(value, (list, tuple)):
+            yield "["
+            for i, item in enumerate(value):
+                if i:
+                    yield ", "
+                yield from self._parts(item)
+            yield "]"
+        elif isinstance(value, str) and len(value) > self._inline_limit and _BASE64.fullmatch(value):
+            yield '"'
+            yield _Blob(value)
+            yield '"'
+        else:
+            yield json.dumps(value)
+
+    def _slices(self, blob: str) -> Iterator[bytes]:
+        for start in range(0, len(blob), self._chunk_size):
+            yield blob[start:start + self._chunk_size].encode("ascii")
+
+    def _compressed_blob(self, blob: str, stream: _GzipStream) -> Iterator[bytes]:
+        h = hashlib.blake2b(digest_size=16)
+        for data in self._slices(blob):
+            h.update(data)
+            stream.count(data)
+        digest = h.digest()
+        block = self._blobs.get(digest) if self._blobs is not None else None
+        if block is not None:
+            yield block
+            return
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        parts = []
+        with span("request.compress", size=len(blob)):
+            for data in self._slices(blob):
+                compressed = compressor.compress(data)
+                if compressed:
+                    parts.append(compressed)
+                    yield compressed
+            compressed = compressor.flush(zlib.Z_FULL_FLUSH)
+            parts.append(compressed)
+            yield compressed
+        if self._blobs is not None:
+            self._blobs.put(digest, b"".join(parts))
@@ -1,10 +1,10 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 
 
 @dataclass()
 class GenerationResponse:
-    images: List[str]
+    images: List[bytes]
     parameters: dict
     info: str
 
@@ -13,3 +13,5 @@ class GenerationResponse:
 class ProgressResponse:
     progress: float
     eta_relative: float
+    # Base64 encoded preview of the image being sampled, when requested and available
+    current_image: Optional[str] = None
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from PyQt5.QtCore import QStandardPaths
+
+from arcane_illusion.constants import EXTENSION_ID
+
+_LENGTH = struct.Struct("<I")
+
+
+@dataclass()
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    size: int
+
+
+class _Writer:
+    def __init__(self, f) -> None:
+        super().__init__()
+        self._f = f
+
+    def add(self, image):
+        self._f.write(_LENGTH.pack(len(image)))
+        self._f.write(image)
+
+
+class _NullWriter:
+    def add(self, image):
+        pass
+
+
+class ResultCache:
+    """Size bounded LRU cache on disk of the images generated for deterministic requests.
+
+    Entries are keyed by a hash of the canonical request payload and of the model hash, and hold the encoded
+    images as received from the backend. Requests with a random seed, or for an unknown model, are not cached.
+    The recency order is saved with the index when an entry is stored, or on `flush`.
+    """
+
+    def __init__(self, directory: str = None, max_bytes: int = 512 * 1024 * 1024) -> None:
+        super().__init__()
+        self._directory = directory or os.path.join(
+            QStandardPaths.writableLocation(QStandardPaths.CacheLocation), EXTENSION_ID, "results")
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: Optional[OrderedDict] = None
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(data: dict, model_hash: Optional[str]) -> Optional[str]:
+        if data.get("seed", -1) == -1 or not model_hash:
+            return None
+        payload = json.dumps(data, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(f"{model_hash}\n{payload}".encode("utf-8")).hexdigest()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            entries = self._load()
+            return CacheStats(self.hits, self.misses, self.evictions, len(entries), sum(entries.values()))
+
+    def get(self, key: Optional[str]) -> Optional[List[bytes]]:
+        if key is None:
+            return None
+        with self._lock:
+            entries = self._load()
+            if key not in entries:
+                self.misses += 1
+                return None
+            entries.move_to_end(key)
+            self._dirty = True
+            self.hits += 1
+        try:
+            with open(self._path(key), "rb") as f:
+                return list(self._read(f))
+        except (OSError, ValueError):
+            # A missing or truncated entry is a miss, and is dropped so that the next result replaces it
+            with self._lock:
+                if self._entries.pop(key, None) is not None:
+                    self._dirty = True
+                self.hits -= 1
+                self.misses += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+
+    @contextmanager
+    def writer(self, key: Optional[str]):
+        """Yields a writer collecting the images of a new entry, which is stored only if the block succeeds"""
+        if key is None:
+            yield _NullWriter()
+            return
+        os.makedirs(self._directory, exist_ok=True)
+        temporary = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary, "wb") as f:
+                yield _Writer(f)
+            size = os.path.getsize(temporary)
+            os.replace(temporary, self._path(key))
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        with self._lock:
+            entries = self._load()
+            entries[key] = size
+            entries.move_to_end(key)
+            self._evict(entries)
+            self._write_index(entries)
+
+    def flush(self):
+        """Saves the recency order of the entries read since the index was last written"""
+        with self._lock:
+            if self._dirty:
+                self._write_index(self._entries)
+
+    def _evict(self, entries: OrderedDict):
+        total = sum(entries.values())
+        while total > self._max_bytes and len(entries) > 1:
+            key, size = entries.popitem(last=False)
+            total -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _read(f) -> Iterator[bytes]:
+        while True:
+            header = f.read(_LENGTH.size)
+            if not header:
+                return
+            if len(header) < _LENGTH.size:
+                raise ValueError("Truncated cache entry")
+            length, = _LENGTH.unpack(header)
+            image = f.read(length)
+            if len(image) < length:
+                raise ValueError("Truncated cache entry")
+            yield image
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.bin")
+
+    def _load(self) -> OrderedDict:
+        if self._entries is None:
+            try:
+                with open(os.path.join(self._directory, "index.json"), encoding="utf-8") as f:
+                    self._entries = OrderedDict(json.load(f))
+            except (OSError, ValueError):
+                self._entries = OrderedDict()
+        return self._entries
+
+    def _write_index(self, entries: OrderedDict):
+        self._dirty = False
+        path = os.path.join(self._directory, "index.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(list(entries.items()), f)
+        os.replace(f"{path}.tmp", path)
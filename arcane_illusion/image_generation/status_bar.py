@@ -1,10 +1,13 @@
 from PyQt5.QtCore import pyqtSlot
 
 from arcane_illusion.widgets import ProgressBar
+from .generation_queue import QueueStats
 from .status import Status
 
 
 class StatusBar(ProgressBar):
+    _queue_text: str = ""
+    _progress_text: str = ""
 
     @pyqtSlot(Status)
     @pyqtSlot(Status, str)
@@ -19,9 +22,39 @@ class StatusBar(ProgressBar):
             self.set_busy(False)
         elif status == Status.Processing:
             self.set_color(ProgressBar.Color.Blue)
-            self.set_text("Processing...")
+            self._progress_text = ""
+            self.set_text(self._processing_text())
             self.set_busy(True)
         else:
             self.set_color(ProgressBar.Color.Yellow)
             self.set_text("Loading...")
             self.set_busy(True)
+
+    @pyqtSlot(QueueStats)
+    def update_queue(self, stats: QueueStats):
+        parts = []
+        if stats.pending:
+            parts.append(f"{stats.pending} queued")
+        if stats.images_per_minute:
+            parts.append(f"{stats.images_per_minute:.1f} img/min")
+        self._queue_text = f" ({', '.join(parts)})" if parts else ""
+        if self._is_processing():
+            self.set_text(self._processing_text())
+            super().update()
+
+    @pyqtSlot(float, float)
+    def update_progress(self, progress: float, eta: float):
+        if not self._is_processing():
+            return
+        if progress > 0:
+            self._progress_text = f" {progress:.0%}, {eta:.0f}s left"
+            self.setRange(0, 100)
+            self.setValue(int(progress * 100))
+        self.set_text(self._processing_text())
+        super().update()
+
+    def _is_processing(self):
+        return bool(self.text()) and self.text().startswith("Processing...")
+
+    def _processing_text(self):
+        return f"Processing...{self._progress_text}{self._queue_text}"
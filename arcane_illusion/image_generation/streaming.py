@@ -0,0 +1,180 @@
+import binascii
+import json
+import re
+from typing import Iterator
+
+from arcane_illusion.tracing import span
+from .cancellation import CancellationToken
+
+_WHITESPACE = b" \t\r\n"
+# Characters of JSON text outside strings which start or end a value
+_STRUCTURAL = re.compile(rb'["\[\]{},:\s]')
+
+
+class StreamError(ValueError):
+    pass
+
+
+class GenerationStream:
+    """Incremental reader of a txt2img/img2img response.
+
+    Iterating yields the decoded bytes of each entry of `images` as soon as it has been read, decoding the
+    base64 text chunk by chunk. The remaining members (`parameters`, `info`) are available once iteration is done.
+    The token, when given, is checked before every read so a cancelled stream stops decoding early.
+    """
+
+    def __init__(self, readable, chunk_size: int = 1 << 16, token: CancellationToken = None) -> None:
+        super().__init__()
+        self._readable = readable
+        self._chunk_size = chunk_size
+        self._token = token
+        self._buffer = b""
+        self._pos = 0
+        self.parameters: dict = {}
+        self.info: str = ""
+
+    def __iter__(self) -> Iterator[bytearray]:
+        self._expect(b"{")
+        if self._peek_token() == b"}":
+            self._pos += 1
+            return
+        while True:
+            key = json.loads(self._raw_value())
+            self._expect(b":")
+            if key == "images" and self._peek_token() == b"[":
+                yield from self._images()
+            else:
+                value = json.loads(self._raw_value())
+                if key in ("parameters", "info"):
+                    setattr(self, key, value)
+            if self._next_token() == b"}":
+                return
+
+    def _images(self) -> Iterator[bytearray]:
+        self._expect(b"[")
+        if self._peek_token() == b"]":
+            self._pos += 1
+            return
+        while True:
+            self._expect(b'"')
+            with span("stream.image") as image_span:
+                image = self._image()
+                image_span.set(size=len(image))
+            yield image
+            if self._next_token() == b"]":
+                return
+
+    def _image(self) -> bytearray:
+        image = bytearray()
+        pending = b""
+        while True:
+            if self._pos >= len(self._buffer) and not self._fill():
+                raise StreamError("Unterminated image string")
+            end = self._buffer.find(b'"', self._pos)
+            chunk = self._buffer[self._pos:len(self._buffer) if end < 0 else end]
+            self._pos += len(chunk)
+            # Base64 never contains backslashes, only escaped solidi ("\/") can show up.
+            pending += chunk.replace(b"\\", b"")
+            if end >= 0:
+                self._pos += 1
+                image += binascii.a2b_base64(pending)
+                return image
+            usable = len(pending) - len(pending) % 4
+            image += binascii.a2b_base64(pending[:usable])
+            pending = pending[usable:]
+
+    def _raw_value(self) -> bytes:
+        """Returns the raw text of the next JSON value.
+
+        Strings are skipped with `find` rather than byte by byte, and the text read so far is set aside in parts
+        rather than kept growing in the buffer, so long echoed strings, e.g. ControlNet images, are cheap to skip.
+        """
+        self._skip_whitespace()
+        parts = []
+        start = self._pos
+        depth = 0
+        in_string = False
+        escaped = False
+        while True:
+            buffer = self._buffer
+            if self._pos >= len(buffer):
+                parts.append(buffer[start:])
+                self._buffer, self._pos, start = b"", 0, 0
+                if not self._fill():
+                    if depth or in_string or not any(parts):
+                        raise StreamError("Unexpected end of response")
+                    return b"".join(parts)
+                continue
+            if in_string:
+                if escaped:
+                    escaped = False
+                    self._pos += 1
+                    continue
+                quote = buffer.find(b'"', self._pos)
+                backslash = buffer.find(b"\\", self._pos, None if quote < 0 else quote)
+                if backslash >= 0:
+                    self._pos = backslash + 1
+                    escaped = True
+                elif quote < 0:
+                    self._pos = len(buffer)
+                else:
+                    self._pos = quote + 1
+                    in_string = False
+                    if depth == 0:
+                        return self._value(parts, start)
+                continue
+            match = _STRUCTURAL.search(buffer, self._pos)
+            if match is None:
+                self._pos = len(buffer)
+                continue
+            self._pos = match.start() + 1
+            c = buffer[match.start()]
+            if c == 0x22:  # quote
+                in_string = True
+            elif c in b"[{":
+                depth += 1
+            elif c in b"]}":
+                if depth == 0:
+                    self._pos -= 1
+                    return self._value(parts, start)
+                depth -= 1
+                if depth == 0:
+                    return self._value(parts, start)
+            elif depth == 0:
+                # A comma, colon or whitespace ends a scalar
+                self._pos -= 1
+                return self._value(parts, start)
+
+    def _value(self, parts: list, start: int) -> bytes:
+        value = self._buffer[start:self._pos]
+        return b"".join(parts) + value if parts else value
+
+    def _fill(self) -> bool:
+        if self._token:
+            self._token.raise_if_cancelled()
+        data = self._readable.read(self._chunk_size)
+        if not data:
+            return False
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def _skip_whitespace(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._fill():
+                return
+
+    def _peek_token(self) -> bytes:
+        self._skip_whitespace()
+        return self._buffer[self._pos:self._pos + 1]
+
+    def _next_token(self) -> bytes:
+        token = self._peek_token()
+        self._pos += 1
+        return token
+
+    def _expect(self, token: bytes):
+        if self._next_token() != token:
+            raise StreamError(f"Expected {token!r} in response")
@@ -0,0 +1,113 @@
+import itertools
+import math
+import re
+from dataclasses import dataclass, field
+from typing import List, Sequence
+
+_GROUP = re.compile(r"\{([^{}]*)\}")
+_RANGE = re.compile(r"^\s*(-?[\d.]+)\s*-\s*(-?[\d.]+)\s*(?::\s*([\d.]+))?\s*$")
+# Most images a sweep may ask for, larger ones are most likely a typo and would freeze the GUI thread
+MAX_CELLS = 1024
+
+
+@dataclass()
+class SweepCell:
+    """One image of the sweep and its place in the contact sheet"""
+    row: int
+    column: int
+    prompt: str
+    seed: int
+    cfg_scale: float
+
+    @property
+    def name(self) -> str:
+        return f"seed {self.seed}, cfg {self.cfg_scale:g}: {self.prompt[:40]}"
+
+
+@dataclass()
+class SweepRequest:
+    """Parameters of a single API call and the cells its images fill, in order"""
+    data: dict
+    cells: List[SweepCell] = field(repr=False)
+
+
+def expand_prompt(prompt: str) -> List[str]:
+    """Every combination of the `{a|b|c}` groups of the prompt.
+
+    Other `|` are left alone, e.g. the `[cow|horse]` alternation of the webui itself.
+    """
+    groups = _GROUP.findall(prompt)
+    if not groups:
+        return [prompt]
+    if math.prod(len(group.split("|")) for group in groups) > MAX_CELLS:
+        raise ValueError(f"More than {MAX_CELLS} prompt combinations")
+    parts = _GROUP.split(prompt)
+    prompts = []
+    for choice in itertools.product(*(group.split("|") for group in groups)):
+        text = "".join(part if i % 2 == 0 else choice[i // 2].strip() for i, part in enumerate(parts))
+        prompts.append(text)
+    return prompts
+
+
+def parse_range(text: str, kind=int) -> list:
+    """Values of a comma separated list of numbers and `start-end` or `start-end:step` ranges, ends included"""
+    values = []
+    for item in filter(None, (item.strip() for item in text.split(","))):
+        match = _RANGE.match(item)
+        if not match:
+            values.append(kind(item))
+            continue
+        start, end = kind(match.group(1)), kind(match.group(2))
+        step = kind(match.group(3)) if match.group(3) else kind(1)
+        if step <= 0:
+            raise ValueError(f"Invalid step in range {item}")
+        if (end - start) / step >= MAX_CELLS - len(values):
+            raise ValueError(f"Range {item} has more than {MAX_CELLS} values")
+        value = start
+        while value <= end + step * 1e-6:
+            values.append(round(value, 6) if kind is float else value)
+            value += step
+    return values
+
+
+def expand(prompt: str, seeds: Sequence[int], cfg_scales: Sequence[float]) -> List[SweepCell]:
+    """Cells of the contact sheet, a row per prompt and CFG scale and a column per seed"""
+    prompts = expand_prompt(prompt)
+    if len(prompts) * len(cfg_scales) * len(seeds) > MAX_CELLS:
+        raise ValueError(f"More than {MAX_CELLS} images")
+    rows = itertools.product(prompts, cfg_scales)
+    return [SweepCell(row, column, prompt, seed, cfg_scale)
+            for row, (prompt, cfg_scale) in enumerate(rows)
+            for column, seed in enumerate(seeds)]
+
+
+def pack(data: dict, cells: Sequence[SweepCell], max_batch: int) -> List[SweepRequest]:
+    """Packs the cells into the fewest API calls.
+
+    The API gives the images of a call consecutive seeds, so cells sharing a prompt and CFG scale whose seeds follow
+    each other go into one call of `batch_size` images repeated `n_iter` times. Random seeds (-1) can always be
+    batched together.
+    """
+    requests = []
+    run: List[SweepCell] = []
+
+    def flush():
+        while run:
+            batch_size = min(len(run), max_batch)
+            n_iter = len(run) // batch_size
+            count = batch_size * n_iter
+            first = run[0]
+            requests.append(SweepRequest({**data, "prompt": first.prompt, "seed": first.seed,
+                                          "cfg_scale": first.cfg_scale, "batch_size": batch_size,
+                                          "n_iter": n_iter}, run[:count]))
+            del run[:count]
+
+    for cell in cells:
+        if run:
+            last = run[-1]
+            follows = cell.seed == -1 and last.seed == -1 or cell.seed == last.seed + 1
+            if not (cell.prompt == last.prompt and cell.cfg_scale == last.cfg_scale and follows):
+                flush()
+        run.append(cell)
+    flush()
+    return requests
@@ -0,0 +1,46 @@
+from PyQt5.QtWidgets import QWidget, QLabel, QLineEdit, QSpinBox
+
+from arcane_illusion.settings import SweepParameters
+from arcane_illusion.widgets import AutoGridLayout
+
+
+class SweepParametersWidget(QWidget):
+    def __init__(self, parameters: SweepParameters):
+        super().__init__()
+        self._parameters = parameters
+        self._build()
+        self._connect()
+
+    def _build(self):
+        layout = AutoGridLayout()
+
+        self._seeds = QLineEdit()
+        self._seeds.setToolTip("Seeds of the columns, e.g. \"1-8\" or \"1, 5, 10-20:5\". "
+                               "Empty for Count random seeds.")
+        layout.add_widget(QLabel("Seeds"))
+        layout.add_widget(self._seeds)
+
+        self._cfg_scales = QLineEdit()
+        self._cfg_scales.setToolTip("CFG scales of the rows, e.g. \"5-9:2\". Empty for the CFG scale above.")
+        layout.add_widget(QLabel("CFG"))
+        layout.add_widget(self._cfg_scales)
+        layout.end_row()
+
+        self._max_batch = QSpinBox()
+        self._max_batch.setRange(1, 64)
+        self._max_batch.setToolTip("Most images a backend generates in one batch")
+        layout.add_widget(QLabel("Max Batch"))
+        layout.add_widget(self._max_batch)
+        layout.end_row()
+
+        self.setLayout(layout)
+
+    def _connect(self):
+        self._seeds.textChanged.connect(lambda value: setattr(self._parameters, "sweep_seeds", value))
+        self._cfg_scales.textChanged.connect(lambda value: setattr(self._parameters, "sweep_cfg_scales", value))
+        self._max_batch.valueChanged.connect(lambda value: setattr(self._parameters, "sweep_max_batch", value))
+
+    def populate_parameters(self):
+        self._seeds.setText(getattr(self._parameters, "sweep_seeds"))
+        self._cfg_scales.setText(getattr(self._parameters, "sweep_cfg_scales"))
+        self._max_batch.setValue(getattr(self._parameters, "sweep_max_batch"))
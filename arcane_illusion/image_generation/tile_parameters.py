@@ -0,0 +1,69 @@
+from PyQt5.QtWidgets import QWidget, QLabel, QSpinBox, QDoubleSpinBox
+
+from arcane_illusion.settings import TileParameters
+from arcane_illusion.widgets import AutoGridLayout
+
+
+class TileParametersWidget(QWidget):
+    def __init__(self, parameters: TileParameters):
+        super().__init__()
+        self._parameters = parameters
+        self._build()
+        self._connect()
+
+    def _build(self):
+        layout = AutoGridLayout()
+
+        self._denoising_strength = QDoubleSpinBox()
+        self._denoising_strength.setDecimals(2)
+        self._denoising_strength.setSingleStep(0.05)
+        self._denoising_strength.setRange(0, 1)
+        layout.add_widget(QLabel("Denoising"))
+        layout.add_widget(self._denoising_strength)
+
+        self._upscale = QDoubleSpinBox()
+        self._upscale.setDecimals(1)
+        self._upscale.setSingleStep(0.5)
+        self._upscale.setRange(1, 4)
+        self._upscale.setSuffix("x")
+        layout.add_widget(QLabel("Upscale"))
+        layout.add_widget(self._upscale)
+        layout.end_row()
+
+        self._tile_size = QSpinBox()
+        self._tile_size.setSingleStep(64)
+        self._tile_size.setRange(256, 2048)
+        layout.add_widget(QLabel("Tile Size"))
+        layout.add_widget(self._tile_size)
+
+        self._tile_overlap = QSpinBox()
+        self._tile_overlap.setSingleStep(8)
+        self._tile_overlap.setRange(0, 512)
+        layout.add_widget(QLabel("Overlap"))
+        layout.add_widget(self._tile_overlap)
+        layout.end_row()
+
+        self._inpaint_margin = QSpinBox()
+        self._inpaint_margin.setSingleStep(16)
+        self._inpaint_margin.setRange(0, 512)
+        self._inpaint_margin.setToolTip("Context sent around the region to inpaint")
+        layout.add_widget(QLabel("Margin"))
+        layout.add_widget(self._inpaint_margin)
+        layout.end_row()
+
+        self.setLayout(layout)
+
+    def _connect(self):
+        self._denoising_strength.valueChanged.connect(
+            lambda value: setattr(self._parameters, "denoising_strength", value))
+        self._upscale.valueChanged.connect(lambda value: setattr(self._parameters, "upscale", value))
+        self._tile_size.valueChanged.connect(lambda value: setattr(self._parameters, "tile_size", value))
+        self._tile_overlap.valueChanged.connect(lambda value: setattr(self._parameters, "tile_overlap", value))
+        self._inpaint_margin.valueChanged.connect(lambda value: setattr(self._parameters, "inpaint_margin", value))
+
+    def populate_parameters(self):
+        self._denoising_strength.setValue(getattr(self._parameters, "denoising_strength"))
+        self._upscale.setValue(getattr(self._parameters, "upscale"))
+        self._tile_size.setValue(getattr(self._parameters, "tile_size"))
+        self._tile_overlap.setValue(getattr(self._parameters, "tile_overlap"))
+        self._inpaint_margin.setValue(getattr(self._parameters, "inpaint_margin"))
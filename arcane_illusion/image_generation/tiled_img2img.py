@@ -0,0 +1,137 @@
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from PyQt5.QtCore import QByteArray, QObject, QThreadPool, QTimer, Qt, pyqtSignal, pyqtSlot
+from PyQt5.QtGui import QImage
+
+from arcane_illusion.tracing import span
+from .cancellation import CancellationToken, Cancelled
+from .dispatcher import Dispatcher
+from .generation_task import GenerationTask
+from .image_ingest import PixelFormat, encode_png, read_region
+from .tiling import Tile, blend, feather, split_tiles
+
+_RGBA_U8 = PixelFormat("RGBA", "U8", "sRGB-elle-V2-srgbtrc.icc")
+
+
+@dataclass()
+class TileResult:
+    tile: Tile
+    image: QImage
+    feathered: QImage
+
+
+class TiledImg2Img(QObject):
+    """Runs img2img over a whole document tile by tile and blends the results into a new layer.
+
+    At most `max_in_flight` tiles are read, sent and decoded at the same time, so the memory used scales with that
+    number rather than with the canvas. Tiles are composited into the layer as soon as they come back.
+    """
+    progress_updated = pyqtSignal(float, float)
+    finished = pyqtSignal()
+    error = pyqtSignal(Exception)
+
+    _refresh_interval = 500
+
+    def __init__(self, dispatcher: Dispatcher, document, data: dict, tile_size: int = 512, overlap: int = 64,
+                 max_in_flight: int = 2, parent=None):
+        super().__init__(parent)
+        self._dispatcher = dispatcher
+        self._document = document
+        self._data = data
+        self._overlap = min(overlap, tile_size // 2)
+        self._max_in_flight = max_in_flight
+        # Read once here, the Krita API must not be called from the workers
+        self._width, self._height = document.width(), document.height()
+        self._tiles = deque(split_tiles(self._width, self._height, tile_size, overlap))
+        self._total = len(self._tiles)
+        self._done = 0
+        self._in_flight = 0
+        self._failed = False
+        self._token = CancellationToken()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max_in_flight)
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(self._refresh_interval)
+        self._refresh_timer.timeout.connect(self._document.refreshProjection)
+        self._layer = None
+        self._started = 0.0
+
+    def start(self):
+        self._started = time.monotonic()
+        document = self._document
+        self._layer = document.createNode(f"{self._data['prompt'][:40]} (tiled)", "paintlayer")
+        document.rootNode().addChildNode(self._layer, None)
+        self._layer.setColorSpace(_RGBA_U8.color_model, _RGBA_U8.color_depth, _RGBA_U8.color_profile)
+        self._dispatch()
+
+    def cancel(self):
+        self._tiles.clear()
+        self._token.cancel()
+
+    def _dispatch(self):
+        while self._tiles and self._in_flight < self._max_in_flight:
+            tile = self._tiles.popleft()
+            # Read as 8-bit sRGB when dispatched, other colour spaces only convert the tile
+            pixels = read_region(self._document, tile.x, tile.y, tile.width, tile.height)
+            self._in_flight += 1
+            task = GenerationTask(lambda tile=tile, pixels=pixels: self._process(tile, pixels))
+            task.signals.finished.connect(self._on_tile_finished)
+            task.signals.error.connect(self._on_tile_error)
+            self._pool.start(task)
+
+    def _process(self, tile: Tile, pixels: bytes) -> TileResult:
+        """Encodes, sends and decodes a tile on a worker thread"""
+        with span("tile.encode"):
+            image = QImage(pixels, tile.width, tile.height, QImage.Format_ARGB32)
+            # Only the first image is kept, a batch would render the tile several times for nothing
+            data = {**self._data, "init_images": [encode_png(image)], "width": tile.width, "height": tile.height,
+                    "batch_size": 1, "n_iter": 1}
+        with self._dispatcher.generate_stream(data, "img2img", self._token) as stream:
+            encoded = next(iter(stream))
+        with span("tile.decode"):
+            result = QImage.fromData(encoded)
+            if result.isNull():
+                raise ValueError("Cannot decode generated tile")
+            if result.width() != tile.width or result.height() != tile.height:
+                result = result.scaled(tile.width, tile.height, transformMode=Qt.SmoothTransformation)
+            result = result.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+            return TileResult(tile, result, feather(result, tile, self._width, self._height, self._overlap))
+
+    @pyqtSlot(object)
+    def _on_tile_finished(self, result: TileResult):
+        tile = result.tile
+        with span("tile.blend"):
+            existing = bytes(self._layer.pixelData(tile.x, tile.y, tile.width, tile.height))
+            destination = QImage(existing, tile.width, tile.height, QImage.Format_ARGB32)
+            blended = blend(destination, result.image, result.feathered)
+            bits = blended.constBits()
+            bits.setsize(blended.bytesPerLine() * blended.height())
+            self._layer.setPixelData(QByteArray(bits.asstring()), tile.x, tile.y, tile.width, tile.height)
+        self._done += 1
+        self._in_flight -= 1
+        elapsed = time.monotonic() - self._started
+        self.progress_updated.emit(self._done / self._total, elapsed / self._done * (self._total - self._done))
+        if not self._refresh_timer.isActive():
+            self._refresh_timer.start()
+        self._dispatch()
+        self._check_finished()
+
+    @pyqtSlot(Exception)
+    def _on_tile_error(self, e: Exception):
+        self._in_flight -= 1
+        self._tiles.clear()
+        if not self._failed and not isinstance(e, Cancelled):
+            self._failed = True
+            self.error.emit(e)
+        self._check_finished()
+
+    def _check_finished(self):
+        if self._in_flight or self._tiles:
+            return
+        self._refresh_timer.stop()
+        self._document.refreshProjection()
+        if not self._failed:
+            self.finished.emit()
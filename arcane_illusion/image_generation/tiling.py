@@ -0,0 +1,68 @@
+from typing import List, NamedTuple
+
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QColor, QImage, QLinearGradient, QPainter
+
+
+class Tile(NamedTuple):
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+def _starts(length: int, size: int, overlap: int) -> List[int]:
+    if length <= size:
+        return [0]
+    step = size - overlap
+    starts = list(range(0, length - size, step))
+    # The last tile is aligned on the far edge so every tile keeps the full size
+    starts.append(length - size)
+    return starts
+
+
+def split_tiles(width: int, height: int, size: int, overlap: int) -> List[Tile]:
+    """Covers the canvas with tiles of at most `size` pixels overlapping by at least `overlap` pixels"""
+    overlap = min(overlap, size // 2)
+    return [
+        Tile(x, y, min(size, width), min(size, height))
+        for y in _starts(height, size, overlap)
+        for x in _starts(width, size, overlap)
+    ]
+
+
+def feather(image: QImage, tile: Tile, width: int, height: int, overlap: int) -> QImage:
+    """Copy of the premultiplied tile image fading out over `overlap` pixels on the sides shared with other tiles"""
+    feathered = image.copy()
+    painter = QPainter(feathered)
+    painter.setCompositionMode(QPainter.CompositionMode_DestinationIn)
+    opaque, transparent = QColor(0, 0, 0, 255), QColor(0, 0, 0, 0)
+    sides = [
+        (tile.x > 0, QRect(0, 0, overlap, tile.height), (0, 0, overlap, 0)),
+        (tile.x + tile.width < width, QRect(tile.width - overlap, 0, overlap, tile.height),
+         (tile.width, 0, tile.width - overlap, 0)),
+        (tile.y > 0, QRect(0, 0, tile.width, overlap), (0, 0, 0, overlap)),
+        (tile.y + tile.height < height, QRect(0, tile.height - overlap, tile.width, overlap),
+         (0, tile.height, 0, tile.height - overlap)),
+    ]
+    for shared, rect, (x1, y1, x2, y2) in sides:
+        if not shared:
+            continue
+        gradient = QLinearGradient(x1, y1, x2, y2)
+        gradient.setColorAt(0, transparent)
+        gradient.setColorAt(1, opaque)
+        painter.fillRect(rect, gradient)
+    painter.end()
+    return feathered
+
+
+def blend(destination: QImage, tile: QImage, feathered: QImage) -> QImage:
+    """Cross-fades the feathered tile over what is already painted, and shows the whole tile where nothing is"""
+    result = destination.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+    painter = QPainter(result)
+    painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+    painter.drawImage(0, 0, feathered)
+    painter.setCompositionMode(QPainter.CompositionMode_DestinationOver)
+    painter.drawImage(0, 0, tile)
+    painter.end()
+    return result.convertToFormat(QImage.Format_ARGB32)
@@ -0,0 +1,32 @@
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QTreeWidget, QTreeWidgetItem
+
+from arcane_illusion.tracing import tracer
+
+
+class TracePanel(QTreeWidget):
+    """Rolling percentiles of the traced spans, refreshed while visible"""
+
+    def __init__(self, parent=None, interval: int = 1000):
+        super().__init__(parent)
+        self.setHeaderLabels(["Span", "Count", "p50 ms", "p90 ms", "p99 ms"])
+        self.setRootIsDecorated(False)
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self._timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self._timer.stop()
+
+    def refresh(self):
+        self.clear()
+        for name, stats in sorted(tracer.stats().items()):
+            self.addTopLevelItem(QTreeWidgetItem([
+                name, str(stats.count), f"{stats.p50 * 1000:.1f}", f"{stats.p90 * 1000:.1f}", f"{stats.p99 * 1000:.1f}",
+            ]))
@@ -1 +1,6 @@
-from .segmentation_palette import SegmentationPalette
+def __getattr__(name):
+    # Importing the widget loads Qt widgets and Krita, the palette tools stay usable on their own
+    if name == "SegmentationPaletteWidget":
+        from .segmentation_palette import SegmentationPaletteWidget
+        return SegmentationPaletteWidget
+    raise AttributeError(name)
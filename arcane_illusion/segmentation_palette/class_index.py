@@ -0,0 +1,46 @@
+from typing import Optional, Sequence
+
+from .segmentation_classes import CLASSES, Class, packed_rgb
+
+UNMATCHED = 255
+
+
+def pack(r: int, g: int, b: int) -> int:
+    return (r << 16) | (g << 8) | b
+
+
+class ClassIndex:
+    """Maps packed 24-bit RGB colors to class ids.
+
+    The table is a 16 MiB bytearray with one byte per color, built on first use, so a lookup is a single index
+    both from Python and, through `numpy.frombuffer`, over whole tiles. Colors that are not in the palette map to
+    `UNMATCHED`.
+    """
+
+    def __init__(self, classes: Sequence[Class] = CLASSES) -> None:
+        super().__init__()
+        if len(classes) >= UNMATCHED:
+            raise ValueError(f"At most {UNMATCHED} classes can be indexed")
+        self.classes = classes
+        self._table: Optional[bytearray] = None
+
+    @property
+    def table(self) -> bytearray:
+        if self._table is None:
+            table = bytearray(b"\xff") * (1 << 24)
+            rgb = packed_rgb(self.classes)
+            # Earlier classes win over later ones sharing the same color
+            for class_id in reversed(range(len(self.classes))):
+                table[pack(*rgb[3 * class_id:3 * class_id + 3])] = class_id
+            self._table = table
+        return self._table
+
+    def get(self, packed: int) -> Optional[int]:
+        class_id = self.table[packed]
+        return None if class_id == UNMATCHED else class_id
+
+    def __len__(self) -> int:
+        return len(self.classes)
+
+
+class_index = ClassIndex()
@@ -0,0 +1,88 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QRect, QSortFilterProxyModel, Qt
+from PyQt5.QtGui import QColor, QIcon, QPainter, QPixmap
+
+ColorRole = Qt.UserRole
+
+
+class SwatchAtlas:
+    """One pixmap holding a small swatch per class, painted on first use and cut into icons as rows are shown"""
+    size = 16
+
+    def __init__(self, classes: Sequence) -> None:
+        super().__init__()
+        self._classes = classes
+        self._pixmap: Optional[QPixmap] = None
+        self._icons: Dict[int, QIcon] = {}
+
+    def _atlas(self) -> QPixmap:
+        if self._pixmap is None:
+            self._pixmap = QPixmap(self.size * len(self._classes), self.size)
+            painter = QPainter(self._pixmap)
+            for row, c in enumerate(self._classes):
+                painter.fillRect(row * self.size, 0, self.size, self.size, QColor(c.r, c.g, c.b))
+            painter.end()
+        return self._pixmap
+
+    def icon(self, row: int) -> QIcon:
+        icon = self._icons.get(row)
+        if icon is None:
+            icon = self._icons[row] = QIcon(self._atlas().copy(QRect(row * self.size, 0, self.size, self.size)))
+        return icon
+
+
+class ClassListModel(QAbstractListModel):
+    """Read-only view over the segmentation classes, rendering swatches only for the rows a view asks for"""
+
+    def __init__(self, classes: Sequence = None, parent=None):
+        super().__init__(parent)
+        if classes is None:
+            from .segmentation_classes import CLASSES
+            classes = CLASSES
+        self._classes = classes
+        self._atlas = SwatchAtlas(classes)
+        self._synonyms: Optional[List[Tuple[str, ...]]] = None
+
+    @property
+    def synonyms(self) -> List[Tuple[str, ...]]:
+        """Lowercased `;`-separated names of every class, in row order"""
+        if self._synonyms is None:
+            from .segmentation_classes import class_synonyms
+            self._synonyms = [tuple(name.lower() for name in names) for names in class_synonyms(self._classes)]
+        return self._synonyms
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._classes)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        c = self._classes[index.row()]
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return c.name
+        if role == Qt.DecorationRole:
+            return self._atlas.icon(index.row())
+        if role == ColorRole:
+            return QColor(c.r, c.g, c.b)
+        return None
+
+
+class ClassFilterModel(QSortFilterProxyModel):
+    """Keeps the classes having a synonym that contains the typed text"""
+
+    def __init__(self, source: ClassListModel, parent=None):
+        super().__init__(parent)
+        self.setSourceModel(source)
+        self._needle = ""
+
+    def set_needle(self, text: str):
+        needle = text.strip().lower()
+        if needle != self._needle:
+            self._needle = needle
+            self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self._needle:
+            return True
+        return any(self._needle in synonym for synonym in self.sourceModel().synonyms[source_row])
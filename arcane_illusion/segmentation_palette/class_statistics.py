@@ -0,0 +1,103 @@
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .class_index import UNMATCHED, ClassIndex, class_index
+from .layer_export import readable_source, tiles
+from .segmentation_classes import class_synonyms
+
+_TRANSPARENT = 256
+
+
+@dataclass()
+class ClassArea:
+    class_id: int
+    pixels: int = 0
+    left: int = 0
+    top: int = 0
+    right: int = 0
+    bottom: int = 0
+
+    def include(self, pixels: int, left: int, top: int, right: int, bottom: int):
+        """Adds pixels found within the given box, right and bottom excluded"""
+        if not self.pixels:
+            self.left, self.top, self.right, self.bottom = left, top, right, bottom
+        else:
+            self.left, self.top = min(self.left, left), min(self.top, top)
+            self.right, self.bottom = max(self.right, right), max(self.bottom, bottom)
+        self.pixels += pixels
+
+
+@dataclass()
+class LayerStatistics:
+    painted: int = 0
+    unmatched: int = 0
+    areas: Dict[int, ClassArea] = field(default_factory=dict)
+
+    def area(self, class_id: int) -> ClassArea:
+        area = self.areas.get(class_id)
+        if area is None:
+            area = self.areas[class_id] = ClassArea(class_id)
+        return area
+
+
+def _measure_numpy(stats: LayerStatistics, table, pixels: bytes, x: int, y: int, width: int, height: int):
+    bgra = np.frombuffer(pixels, dtype="<u4").reshape(height, width)
+    ids = table[bgra & 0xFFFFFF].astype(np.uint16)
+    ids[(bgra >> 24) == 0] = _TRANSPARENT
+    counts = np.bincount(ids.ravel(), minlength=_TRANSPARENT + 1)
+    stats.painted += int(counts[:_TRANSPARENT].sum())
+    stats.unmatched += int(counts[UNMATCHED])
+    for class_id in np.flatnonzero(counts[:UNMATCHED]):
+        mask = ids == class_id
+        rows = np.flatnonzero(mask.any(axis=1))
+        columns = np.flatnonzero(mask.any(axis=0))
+        stats.area(int(class_id)).include(int(counts[class_id]), x + int(columns[0]), y + int(rows[0]),
+                                          x + int(columns[-1]) + 1, y + int(rows[-1]) + 1)
+
+
+def _measure_python(stats: LayerStatistics, table, pixels: bytes, x: int, y: int, width: int, height: int):
+    for row in range(height):
+        offset = row * width * 4
+        for column in range(width):
+            b, g, r, a = pixels[offset:offset + 4]
+            offset += 4
+            if not a:
+                continue
+            stats.painted += 1
+            class_id = table[(r << 16) | (g << 8) | b]
+            if class_id == UNMATCHED:
+                stats.unmatched += 1
+            else:
+                stats.area(class_id).include(1, x + column, y + row, x + column + 1, y + row + 1)
+
+
+def measure_layer(node, index: ClassIndex = class_index, tile_size: int = 1024) -> LayerStatistics:
+    """Counts the pixels and bounding box of every class in a single pass, holding one tile at a time.
+
+    Fully transparent pixels are skipped, and painted pixels that are not an exact palette color are counted as
+    unmatched.
+    """
+    stats = LayerStatistics()
+    if np is not None:
+        table, measure = np.frombuffer(index.table, dtype=np.uint8), _measure_numpy
+    else:
+        table, measure = index.table, _measure_python
+    source = readable_source(node)
+    for x, y, width, height in tiles(node.bounds(), tile_size):
+        measure(stats, table, bytes(source.pixelData(x, y, width, height)), x, y, width, height)
+    return stats
+
+
+def report_lines(stats: LayerStatistics, index: ClassIndex = class_index) -> List[str]:
+    synonyms = class_synonyms(index.classes)
+    lines = []
+    for area in sorted(stats.areas.values(), key=lambda a: a.pixels, reverse=True):
+        name = synonyms[area.class_id][0]
+        lines.append(f"{name}: {area.pixels} px ({area.pixels / stats.painted:.1%}), "
+                     f"{area.right - area.left}x{area.bottom - area.top} at {area.left},{area.top}")
+    return lines
@@ -0,0 +1,34 @@
+from PyQt5.QtCore import QByteArray
+
+from .quantize import PaletteQuantizer, palette_quantizer
+
+_RGBA_U8 = ("RGBA", "U8", "sRGB-elle-V2-srgbtrc.icc")
+
+
+def tiles(bounds, tile_size: int):
+    for y in range(bounds.top(), bounds.top() + bounds.height(), tile_size):
+        for x in range(bounds.left(), bounds.left() + bounds.width(), tile_size):
+            yield (x, y, min(tile_size, bounds.left() + bounds.width() - x),
+                   min(tile_size, bounds.top() + bounds.height() - y))
+
+
+def readable_source(node):
+    """The node itself when its pixels are 8-bit sRGB RGBA, otherwise a converted copy"""
+    if (node.colorModel(), node.colorDepth(), node.colorProfile()) == _RGBA_U8:
+        return node
+    source = node.duplicate()
+    source.setColorSpace(*_RGBA_U8)
+    return source
+
+
+def snap_layer(document, node, quantizer: PaletteQuantizer = palette_quantizer, tile_size: int = 1024):
+    """Adds a copy of the layer above it with every pixel snapped to the nearest segmentation class color"""
+    layer = document.createNode(f"{node.name()} (segmentation)", "paintlayer")
+    node.parentNode().addChildNode(layer, node)
+    layer.setColorSpace(*_RGBA_U8)
+    source = readable_source(node)
+    for x, y, width, height in tiles(node.bounds(), tile_size):
+        pixels = source.pixelData(x, y, width, height)
+        layer.setPixelData(QByteArray(quantizer.quantize(bytes(pixels))), x, y, width, height)
+    document.refreshProjection()
+    return layer
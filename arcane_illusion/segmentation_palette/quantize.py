@@ -0,0 +1,93 @@
+from typing import Dict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .class_index import UNMATCHED, ClassIndex, class_index
+from .segmentation_classes import packed_rgb
+
+
+class PaletteQuantizer:
+    """Snaps BGRA pixels to the nearest palette color, keeping alpha.
+
+    With NumPy, pixels are resolved through a copy of the class index table, one lookup each. The distinct
+    off-palette colors not seen before go through a vectorised nearest color search, whose results are written back
+    into the table, so each color is only searched once per quantizer, across tiles and layers. Without NumPy, a
+    per-color memo keeps the pure Python path usable on mostly clean layers.
+    """
+
+    def __init__(self, index: ClassIndex = class_index) -> None:
+        super().__init__()
+        self._index = index
+        self._colors = None
+        self._lookup = None
+        self._memo: Dict[int, bytes] = {}
+
+    def quantize(self, pixels: bytes) -> bytes:
+        if np is not None:
+            return self._quantize_numpy(pixels)
+        return self._quantize_python(pixels)
+
+    def _arrays(self):
+        if self._lookup is None:
+            colors = np.frombuffer(packed_rgb(self._index.classes), dtype=np.uint8).astype(np.uint32).reshape(-1, 3)
+            # |c - p|^2 - |c|^2 = [c, 1] . [-2p, |p|^2], the same order of palette colors for a single product.
+            # These are integers below 2^24 in magnitude, which float32 holds exactly.
+            palette = colors.astype(np.float32)
+            self._weights = np.vstack([-2 * palette.T, (palette ** 2).sum(axis=1)])
+            # Little-endian BGRA pixels read as uint32 are 0xAARRGGBB
+            self._packed = (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+            self._lookup = np.array(np.frombuffer(self._index.table, dtype=np.uint8))
+        return self._lookup
+
+    def _nearest(self, packed):
+        colors = np.ones((len(packed), 4), dtype=np.float32)
+        colors[:, 0], colors[:, 1], colors[:, 2] = (packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF
+        nearest = np.empty(len(packed), dtype=np.uint8)
+        for start in range(0, len(packed), 16384):
+            nearest[start:start + 16384] = (colors[start:start + 16384] @ self._weights).argmin(axis=1)
+        return nearest
+
+    def _quantize_numpy(self, pixels: bytes) -> bytes:
+        lookup = self._arrays()
+        bgra = np.frombuffer(pixels, dtype="<u4")
+        packed = bgra & 0xFFFFFF
+        # np.take is markedly faster than fancy indexing for these plain gathers
+        ids = np.take(lookup, packed)
+        unmatched = ids == UNMATCHED
+        if unmatched.any():
+            colors, inverse = np.unique(packed[unmatched], return_inverse=True)
+            nearest = self._nearest(colors)
+            lookup[colors] = nearest
+            ids[unmatched] = nearest[inverse]
+        result = np.take(self._packed, ids)
+        result |= bgra & 0xFF000000
+        return result.astype("<u4", copy=False).tobytes()
+
+    def _nearest_python(self, packed: int) -> bytes:
+        if self._colors is None:
+            rgb = packed_rgb(self._index.classes)
+            self._colors = [tuple(rgb[i:i + 3]) for i in range(0, len(rgb), 3)]
+        r, g, b = (packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF
+        nr, ng, nb = min(self._colors, key=lambda c: (c[0] - r) ** 2 + (c[1] - g) ** 2 + (c[2] - b) ** 2)
+        return bytes((nb, ng, nr))
+
+    def _quantize_python(self, pixels: bytes) -> bytes:
+        result = bytearray(pixels)
+        table = self._index.table
+        memo = self._memo
+        for offset in range(0, len(result), 4):
+            packed = (result[offset + 2] << 16) | (result[offset + 1] << 8) | result[offset]
+            if table[packed] != UNMATCHED:
+                continue
+            bgr = memo.get(packed)
+            if bgr is None:
+                bgr = memo[packed] = self._nearest_python(packed)
+            result[offset:offset + 3] = bgr
+        return bytes(result)
+
+
+# Shared so that the colors searched once are known to every later snap
+palette_quantizer = PaletteQuantizer()
@@ -1,4 +1,9 @@
-from typing import NamedTuple
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 
 
 class Class(NamedTuple):
@@ -10,162 +15,107 @@ class Class(NamedTuple):
     # TODO: translations: Dict[str, str]
 
 
+_MAGIC = b"ADE\x01"
+_HEADER = struct.Struct("<4sHH8I")
+_RESOURCE = os.path.join(os.path.dirname(__file__), "ade20k.bin")
+
+
+class ClassTable(Sequence[Class]):
+    """The ADE20K classes, read from the binary resource written by `tools/build_ade20k.py`.
+
+    The file is mapped on first use and its sections are only wrapped in memoryviews: packed RGB, a bitmask of the
+    "stuff" classes, and string tables of the full names and of the synonyms of each class. Indexing builds the
+    `Class` tuple of that row only, so the palette tools can work off the packed tables without ever creating them.
+    """
+
+    def __init__(self, path: str = _RESOURCE) -> None:
+        super().__init__()
+        self._path = path
+        self._view: Optional[memoryview] = None
+        self._classes: Dict[int, Class] = {}
+
+    def _load(self) -> memoryview:
+        if self._view is None:
+            with open(self._path, "rb") as f:
+                try:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    data = f.read()
+            view = memoryview(data)
+            magic, self._count, synonym_count, *offsets = _HEADER.unpack_from(view)
+            if magic != _MAGIC or offsets[-1] != len(view):
+                raise ValueError(f"{self._path} is not a class table")
+            rgb, stuff, name_offsets, names, synonym_starts, synonym_offsets, synonyms, end = offsets
+            self._rgb = view[rgb:rgb + 3 * self._count]
+            self._stuff = view[stuff:name_offsets]
+            self._name_offsets = self._integers(view[name_offsets:name_offsets + 4 * (self._count + 1)], "I")
+            self._names = view[names:synonym_starts]
+            self._synonym_starts = self._integers(view[synonym_starts:synonym_starts + 2 * (self._count + 1)], "H")
+            self._synonym_offsets = self._integers(view[synonym_offsets:synonym_offsets + 4 * (synonym_count + 1)], "I")
+            self._synonym_names = view[synonyms:end]
+            self._view = view
+        return self._view
+
+    @staticmethod
+    def _integers(view: memoryview, kind: str) -> Union[memoryview, array]:
+        if sys.byteorder == "little":
+            return view.cast(kind)
+        values = array(kind, view)
+        values.byteswap()
+        return values
+
+    @property
+    def rgb(self) -> memoryview:
+        """Red, green and blue of every class, three bytes each"""
+        self._load()
+        return self._rgb
+
+    def is_stuff(self, index: int) -> bool:
+        self._load()
+        return bool(self._stuff[index // 8] >> (index % 8) & 1)
+
+    def name(self, index: int) -> str:
+        self._load()
+        return str(self._names[self._name_offsets[index]:self._name_offsets[index + 1]], "utf-8")
+
+    def synonyms(self, index: int) -> Tuple[str, ...]:
+        self._load()
+        offsets = self._synonym_offsets
+        return tuple(str(self._synonym_names[offsets[i]:offsets[i + 1]], "utf-8")
+                     for i in range(self._synonym_starts[index], self._synonym_starts[index + 1]))
+
+    def __len__(self) -> int:
+        self._load()
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("class index out of range")
+        c = self._classes.get(index)
+        if c is None:
+            r, g, b = self._rgb[3 * index:3 * index + 3]
+            c = self._classes[index] = Class(self.name(index), r, g, b, self.is_stuff(index))
+        return c
+
+
+def packed_rgb(classes: Sequence[Class]) -> Union[bytes, memoryview]:
+    """Red, green and blue of the classes, three bytes each, straight from the table when possible"""
+    if isinstance(classes, ClassTable):
+        return classes.rgb
+    return bytes(value for c in classes for value in (c.r, c.g, c.b))
+
+
+def class_synonyms(classes: Sequence[Class]) -> List[Tuple[str, ...]]:
+    """The `;`-separated names of every class"""
+    if isinstance(classes, ClassTable):
+        return [classes.synonyms(i) for i in range(len(classes))]
+    return [tuple(c.name.split(";")) for c in classes]
+
+
 # Reference: https://github.com/CSAILVision/semantic-segmentation-pytorch
-# Source: https://docs.google.com/spreadsheets/d/1se8YEtb2detS7OuPE86fXGyD269pMycAWe2mtKUj2W8/edit#gid=0
-CLASSES = [
-    Class("wall", 120, 120, 120, True),
-    Class("building;edifice", 180, 120, 120, True),
-    Class("sky", 6, 230, 230, True),
-    Class("floor;flooring", 80, 50, 50, True),
-    Class("tree", 4, 200, 3, False),
-    Class("ceiling", 120, 120, 80, True),
-    Class("road;route", 140, 140, 140, True),
-    Class("bed", 204, 5, 255, False),
-    Class("windowpane;window", 230, 230, 230, False),
-    Class("grass", 4, 250, 7, True),
-    Class("cabinet", 224, 5, 255, False),
-    Class("sidewalk;pavement", 235, 255, 7, True),
-    Class("person;individual;someone;somebody;mortal;soul", 150, 5, 61, False),
-    Class("earth;ground", 120, 120, 70, True),
-    Class("door;double;door", 8, 255, 51, False),
-    Class("table", 255, 6, 82, False),
-    Class("mountain;mount", 143, 255, 140, True),
-    Class("plant;flora;plant;life", 204, 255, 4, False),
-    Class("curtain;drape;drapery;mantle;pall", 255, 51, 7, False),
-    Class("chair", 204, 70, 3, False),
-    Class("car;auto;automobile;machine;motorcar", 0, 102, 200, False),
-    Class("water", 61, 230, 250, True),
-    Class("painting;picture", 255, 6, 51, False),
-    Class("sofa;couch;lounge", 11, 102, 255, False),
-    Class("shelf", 255, 7, 71, False),
-    Class("house", 255, 9, 224, True),
-    Class("sea", 9, 7, 230, True),
-    Class("mirror", 220, 220, 220, False),
-    Class("rug;carpet;carpeting", 255, 9, 92, True),
-    Class("field", 112, 9, 255, True),
-    Class("armchair", 8, 255, 214, False),
-    Class("seat", 7, 255, 224, False),
-    Class("fence;fencing", 255, 184, 6, False),
-    Class("desk", 10, 255, 71, False),
-    Class("rock;stone", 255, 41, 10, False),
-    Class("wardrobe;closet;press", 7, 255, 255, False),
-    Class("lamp", 224, 255, 8, False),
-    Class("bathtub;bathing;tub;bath;tub", 102, 8, 255, False),
-    Class("railing;rail", 255, 61, 6, False),
-    Class("cushion", 255, 194, 7, False),
-    Class("base;pedestal;stand", 255, 122, 8, False),
-    Class("box", 0, 255, 20, False),
-    Class("column;pillar", 255, 8, 41, False),
-    Class("signboard;sign", 255, 5, 153, False),
-    Class("chest;of;drawers;chest;bureau;dresser", 6, 51, 255, False),
-    Class("counter", 235, 12, 255, False),
-    Class("sand", 160, 150, 20, True),
-    Class("sink", 0, 163, 255, False),
-    Class("skyscraper", 140, 140, 140, True),
-    Class("fireplace;hearth;open;fireplace", 250, 10, 15, False),
-    Class("refrigerator;icebox", 20, 255, 0, False),
-    Class("grandstand;covered;stand", 31, 255, 0, True),
-    Class("path", 255, 31, 0, True),
-    Class("stairs;steps", 255, 224, 0, False),
-    Class("runway", 153, 255, 0, True),
-    Class("case;display;case;showcase;vitrine", 0, 0, 255, False),
-    Class("pool;table;billiard;table;snooker;table", 255, 71, 0, False),
-    Class("pillow", 0, 235, 255, False),
-    Class("screen;door;screen", 0, 173, 255, False),
-    Class("stairway;staircase", 31, 0, 255, True),
-    Class("river", 11, 200, 200, True),
-    Class("bridge;span", 255, 82, 0, True),
-    Class("bookcase", 0, 255, 245, False),
-    Class("blind;screen", 0, 61, 255, False),
-    Class("coffee;table;cocktail;table", 0, 255, 112, False),
-    Class("toilet;can;commode;crapper;pot;potty;stool;throne", 0, 255, 133, False),
-    Class("flower", 255, 0, 0, False),
-    Class("book", 255, 163, 0, False),
-    Class("hill", 255, 102, 0, True),
-    Class("bench", 194, 255, 0, False),
-    Class("countertop", 0, 143, 255, False),
-    Class("stove;kitchen;stove;range;kitchen;range;cooking;stove", 51, 255, 0, False),
-    Class("palm;palm;tree", 0, 82, 255, False),
-    Class("kitchen;island", 0, 255, 41, False),
-    Class(
-        "computer;computing;machine;computing;device;data;processor;electronic;computer;information;processing;system",
-        0, 255, 173, False),
-    Class("swivel;chair", 10, 0, 255, False),
-    Class("boat", 173, 255, 0, False),
-    Class("bar", 0, 255, 153, False),
-    Class("arcade;machine", 255, 92, 0, False),
-    Class("hovel;hut;hutch;shack;shanty", 255, 0, 255, True),
-    Class("bus;autobus;coach;charabanc;double-decker;jitney;motorbus;motorcoach;omnibus;passenger;vehicle", 255, 0, 245,
-          False),
-    Class("towel", 255, 0, 102, False),
-    Class("light;light;source", 255, 173, 0, False),
-    Class("truck;motortruck", 255, 0, 20, False),
-    Class("tower", 255, 184, 184, True),
-    Class("chandelier;pendant;pendent", 0, 31, 255, False),
-    Class("awning;sunshade;sunblind", 0, 255, 61, False),
-    Class("streetlight;street;lamp", 0, 71, 255, False),
-    Class("booth;cubicle;stall;kiosk", 255, 0, 204, False),
-    Class("television;television;receiver;television;set;tv;tv;set;idiot;box;boob;tube;telly;goggle;box", 0, 255, 194,
-          False),
-    Class("airplane;aeroplane;plane", 0, 255, 82, False),
-    Class("dirt;track", 0, 10, 255, True),
-    Class("apparel;wearing;apparel;dress;clothes", 0, 112, 255, False),
-    Class("pole", 51, 0, 255, False),
-    Class("land;ground;soil", 0, 194, 255, True),
-    Class("bannister;banister;balustrade;balusters;handrail", 0, 122, 255, False),
-    Class("escalator;moving;staircase;moving;stairway", 0, 255, 163, True),
-    Class("ottoman;pouf;pouffe;puff;hassock", 255, 153, 0, False),
-    Class("bottle", 0, 255, 10, False),
-    Class("buffet;counter;sideboard", 255, 112, 0, False),
-    Class("poster;posting;placard;notice;bill;card", 143, 255, 0, False),
-    Class("stage", 82, 0, 255, True),
-    Class("van", 163, 255, 0, False),
-    Class("ship", 255, 235, 0, False),
-    Class("fountain", 8, 184, 170, False),
-    Class("conveyer;belt;conveyor;belt;conveyer;conveyor;transporter", 133, 0, 255, True),
-    Class("canopy", 0, 255, 92, False),
-    Class("washer;automatic;washer;washing;machine", 184, 0, 255, False),
-    Class("plaything;toy", 255, 0, 31, False),
-    Class("swimming;pool;swimming;bath;natatorium", 0, 184, 255, True),
-    Class("stool", 0, 214, 255, False),
-    Class("barrel;cask", 255, 0, 112, False),
-    Class("basket;handbasket", 92, 255, 0, False),
-    Class("waterfall;falls", 0, 224, 255, True),
-    Class("tent;collapsible;shelter", 112, 224, 255, False),
-    Class("bag", 70, 184, 160, False),
-    Class("minibike;motorbike", 163, 0, 255, False),
-    Class("cradle", 153, 0, 255, False),
-    Class("oven", 71, 255, 0, False),
-    Class("ball", 255, 0, 163, False),
-    Class("food;solid;food", 255, 204, 0, False),
-    Class("step;stair", 255, 0, 143, False),
-    Class("tank;storage;tank", 0, 255, 235, False),
-    Class("trade;name;brand;name;brand;marque", 133, 255, 0, False),
-    Class("microwave;microwave;oven", 255, 0, 235, False),
-    Class("pot;flowerpot", 245, 0, 255, False),
-    Class("animal;animate;being;beast;brute;creature;fauna", 255, 0, 122, False),
-    Class("bicycle;bike;wheel;cycle", 255, 245, 0, False),
-    Class("lake", 10, 190, 212, True),
-    Class("dishwasher;dish;washer;dishwashing;machine", 214, 255, 0, False),
-    Class("screen;silver;screen;projection;screen", 0, 204, 255, False),
-    Class("blanket;cover", 20, 0, 255, False),
-    Class("sculpture", 255, 255, 0, False),
-    Class("hood;exhaust;hood", 0, 153, 255, False),
-    Class("sconce", 0, 41, 255, False),
-    Class("vase", 0, 255, 204, False),
-    Class("traffic;light;traffic;signal;stoplight", 41, 0, 255, False),
-    Class("tray", 41, 255, 0, False),
-    Class("ashcan;trash;can;garbage;can;wastebin;ash;bin;ash-bin;ashbin;dustbin;trash;barrel;trash;bin", 173, 0, 255,
-          False),
-    Class("fan", 0, 245, 255, False),
-    Class("pier;wharf;wharfage;dock", 71, 0, 255, True),
-    Class("crt;screen", 122, 0, 255, False),
-    Class("plate", 0, 255, 184, False),
-    Class("monitor;monitoring;device", 0, 92, 255, False),
-    Class("bulletin;board;notice;board", 184, 255, 0, False),
-    Class("shower", 0, 133, 255, False),
-    Class("radiator", 255, 214, 0, False),
-    Class("glass;drinking;glass", 25, 194, 194, False),
-    Class("clock", 102, 255, 0, False),
-    Class("flag", 92, 0, 255, False),
-]
+CLASSES = ClassTable()
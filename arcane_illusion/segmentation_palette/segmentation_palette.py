@@ -1,12 +1,9 @@
-from typing import ClassVar
+from PyQt5.QtCore import pyqtSlot
+from PyQt5.QtWidgets import QComboBox, QCompleter, QListView, QMessageBox, QPushButton, QVBoxLayout, QWidget
 
-from PyQt5.QtCore import pyqtSlot, Qt
-from PyQt5.QtGui import QColor, QIcon, QPixmap
-from PyQt5.QtWidgets import QComboBox, QCompleter, QListView, QSizePolicy
+from krita import Krita, ManagedColor
 
-from krita import DockWidget, Krita, ManagedColor
-
-from .segmentation_classes import CLASSES
+from .class_model import ClassFilterModel, ClassListModel, ColorRole
 
 
 class ClassComboBox(QComboBox):
@@ -18,44 +15,68 @@ class ClassComboBox(QComboBox):
         list_view = QListView()
         list_view.setWordWrap(True)
         self.setView(list_view)
-        self.completer().setCompletionMode(QCompleter.PopupCompletion)
-        self.completer().setFilterMode(Qt.MatchContains)
+        self.setModel(ClassListModel(parent=self))
+        self._filter = ClassFilterModel(self.model(), self)
+        # The proxy does the MatchContains filtering over synonyms, the completer shows whatever it keeps
+        completer = QCompleter(self._filter, self)
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        completer.popup().setWordWrap(True)
+        self.setCompleter(completer)
+        self.lineEdit().textEdited.connect(self._filter.set_needle)
         self.currentIndexChanged.connect(self.on_index_changed)
 
-    def add_class(self, c):
-        color = QColor(c.r, c.g, c.b)
-        pixmap = QPixmap(64, 64)
-        pixmap.fill(color)
-        icon = QIcon(pixmap)
-        self.addItem(icon, c.name, color)
-
-    def add_classes(self, classes):
-        for c in classes:
-            self.add_class(c)
-
     @pyqtSlot(int)
     def on_index_changed(self, index):
-        color = self.itemData(index)
+        color = self.itemData(index, ColorRole)
         active_window = Krita.instance().activeWindow()
         active_view = active_window and active_window.activeView()
-        if active_view:
+        if color is not None and active_view:
             managed_color = ManagedColor.fromQColor(color)
             active_view.setForeGroundColor(managed_color)
 
 
-class SegmentationPalette(DockWidget):
-    id: ClassVar[str] = 'segmentation_palette'
-
+class SegmentationPaletteWidget(QWidget):
     def __init__(self):
         super().__init__()
         self._build_interface()
 
     def _build_interface(self):
-        self.setWindowTitle("AI - Segmentation Palette")
+        layout = QVBoxLayout()
         combobox = ClassComboBox()
-        combobox.add_classes(CLASSES)
         combobox.setCurrentIndex(-1)
-        self.setWidget(combobox)
+        layout.addWidget(combobox)
+        snap_button = QPushButton("Snap Layer to Palette")
+        snap_button.setToolTip("Copy the active layer with every pixel snapped to the nearest class color")
+        snap_button.clicked.connect(self._snap_active_layer)
+        layout.addWidget(snap_button)
+        statistics_button = QPushButton("Class Statistics")
+        statistics_button.setToolTip("Count the pixels and bounding box of every class in the active layer")
+        statistics_button.clicked.connect(self._show_class_statistics)
+        layout.addWidget(statistics_button)
+        layout.addStretch(0)
+        self.setLayout(layout)
+
+    def _active_node(self):
+        document = Krita.instance().activeDocument()
+        node = document and document.activeNode()
+        if not node:
+            QMessageBox.warning(QWidget(), "Warning", "No active layer.")
+        return document, node
+
+    def _snap_active_layer(self):
+        from .layer_export import snap_layer
+        document, node = self._active_node()
+        if node:
+            snap_layer(document, node)
 
-    def canvasChanged(self, canvas):
-        pass
+    def _show_class_statistics(self):
+        from .class_statistics import measure_layer, report_lines
+        _, node = self._active_node()
+        if not node:
+            return
+        stats = measure_layer(node)
+        box = QMessageBox(QMessageBox.Information, "Class Statistics",
+                          f"{len(stats.areas)} classes over {stats.painted} painted pixels, "
+                          f"{stats.unmatched} off-palette.")
+        box.setDetailedText("\n".join(report_lines(stats)))
+        box.exec_()
@@ -1,5 +1,9 @@
-from dataclasses import dataclass, asdict, field
-from typing import TypeVar
+import atexit
+import json
+import os
+import threading
+from dataclasses import dataclass, asdict, field, fields
+from typing import Dict, List, Optional, TypeVar
 
 try:
     from PyQt5.QtCore import QSettings
@@ -20,6 +24,9 @@ except:
         def value(self, key, type):
             return self.get(key)
 
+        def fileName(self):
+            return ""
+
 try:
     from .constants import KRITA_NAME, EXTENSION_ID
 except:
@@ -27,31 +34,176 @@ except:
 
 T = TypeVar("T")
 
+_MISSING = object()
+
+# Only read, to carry over the values saved before the settings moved to `SettingsStore`
 _settings = QSettings(QSettings.IniFormat, QSettings.UserScope, KRITA_NAME, EXTENSION_ID)
 
 
+class SettingsStore:
+    """Values of every settings section, named presets and per-document profiles in a single JSON file.
+
+    Everything is kept in memory. Saving only records the values that changed and arms a timer thread writing the
+    file once nothing changed for `delay` seconds, so callers never wait on the disk. Without a path nothing is
+    written.
+    """
+
+    def __init__(self, path: Optional[str], delay: float = 1.0) -> None:
+        super().__init__()
+        self._path = path
+        self._delay = delay
+        self._lock = threading.Lock()
+        # Held while writing the file, so the timer and an explicit flush write one after the other
+        self._write_lock = threading.Lock()
+        self._data: Optional[dict] = None
+        self._timer: Optional[threading.Timer] = None
+        self._dirty = False
+
+    def get(self, key: str, profile: str = None, default=None):
+        """The value in the profile when it has one, the global value otherwise"""
+        with self._lock:
+            data = self._load()
+            values = data["profiles"].get(profile, {}) if profile else {}
+            return values.get(key, data["values"].get(key, default))
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._load()["values"]
+
+    def update(self, values: dict, profile: str = None):
+        with self._lock:
+            data = self._load()
+            targets = [data["values"]]
+            if profile:
+                targets.append(data["profiles"].setdefault(profile, {}))
+            for target in targets:
+                for key, value in values.items():
+                    if target.get(key, _MISSING) != value:
+                        target[key] = value
+                        self._dirty = True
+            self._schedule()
+
+    def has_profile(self, profile: str) -> bool:
+        with self._lock:
+            return profile in self._load()["profiles"]
+
+    def presets(self) -> List[str]:
+        with self._lock:
+            return sorted(self._load()["presets"])
+
+    def preset(self, name: str) -> Optional[dict]:
+        with self._lock:
+            values = self._load()["presets"].get(name)
+            return dict(values) if values is not None else None
+
+    def save_preset(self, name: str, values: dict):
+        with self._lock:
+            self._load()["presets"][name] = dict(values)
+            self._dirty = True
+            self._schedule()
+
+    def delete_preset(self, name: str):
+        with self._lock:
+            if self._load()["presets"].pop(name, None) is not None:
+                self._dirty = True
+                self._schedule()
+
+    def flush(self):
+        """Writes the pending changes right away"""
+        with self._write_lock:
+            with self._lock:
+                if self._timer:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty or not self._path:
+                    return
+                self._dirty = False
+                text = json.dumps(self._data, separators=(",", ":"))
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temporary = f"{self._path}.tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(temporary, self._path)
+
+    def _schedule(self):
+        if not self._dirty or not self._path:
+            return
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(self._delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _load(self) -> dict:
+        if self._data is None:
+            data = {}
+            if self._path:
+                try:
+                    with open(self._path, encoding="utf-8") as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    pass
+            self._data = {"values": data.get("values", {}), "presets": data.get("presets", {}),
+                          "profiles": data.get("profiles", {})}
+        return self._data
+
+
+def _store_path() -> Optional[str]:
+    path = _settings.fileName()
+    return path and os.path.join(os.path.dirname(path), f"{EXTENSION_ID}.json")
+
+
+store = SettingsStore(_store_path())
+atexit.register(store.flush)
+
+
 class _Base:
     def as_dict(self):
         return asdict(self)
 
-    def save(self):
-        d = self.as_dict()
-        for key in d.keys():
-            value = getattr(self, key)
-            _settings.setValue(key, value)
+    def save(self, profile: str = None):
+        """Records the values, and in the profile when given, to be written in the background"""
+        store.update(self.as_dict(), profile)
 
-    def load(self):
+    def load(self, profile: str = None):
         annotations = self.__annotations__
-        d = self.as_dict()
-        for key in d.keys():
-            if _settings.contains(key):
+        for key in self.as_dict().keys():
+            if key in store:
+                setattr(self, key, store.get(key, profile))
+            elif _settings.contains(key):
                 value = _settings.value(key, type=annotations[key])
                 setattr(self, key, value)
 
+    def apply(self, values: Dict[str, object]):
+        """Sets the fields found in the values, e.g. those of a preset spanning several sections"""
+        for f in fields(self):
+            if f.name in values:
+                setattr(self, f.name, values[f.name])
+
 
 @dataclass
 class Options(_Base):
     url: str = field(default="http://localhost:7860")
+    # Additional backend URLs separated by whitespace or commas
+    backends: str = field(default="")
+    max_in_flight: int = field(default=1)
+    result_cache_size: int = field(default=512)  # MiB
+    tracing: bool = field(default=False)
+    connect_timeout: float = field(default=10.0)  # Seconds
+    # Seconds without receiving anything, a whole batch is generated before the response starts
+    read_timeout: float = field(default=600.0)
+    live_preview: bool = field(default=False)
+    # Check backends, list their options, poll their progress and interrupt them on a single asyncio event loop thread
+    # instead of one worker thread each, generations keep their worker threads as their responses are streamed
+    async_transport: bool = field(default=False)
+    # Gzip generation payloads, until a backend answers that it cannot read them
+    compress_uploads: bool = field(default=False)
+
+    def backend_urls(self) -> List[str]:
+        urls = [self.url] + self.backends.replace(",", " ").split()
+        return list(dict.fromkeys(url.rstrip("/") for url in urls))
 
 
 @dataclass
@@ -65,6 +217,34 @@ class Parameters(_Base):
     height: int = field(default=512)
     seed: int = field(default=-1)
     cfg_scale: float = field(default=7)
+    batch_size: int = field(default=1)
+
+
+@dataclass
+class TileParameters(_Base):
+    denoising_strength: float = field(default=0.35)
+    tile_size: int = field(default=512)
+    tile_overlap: int = field(default=64)
+    upscale: float = field(default=1.0)
+    # Pixels of context around the inpainted region
+    inpaint_margin: int = field(default=64)
+
+
+@dataclass
+class ControlNetParameters(_Base):
+    control_net_enabled: bool = field(default=False)
+    control_net_model: str = field(default=None)
+    control_net_weight: float = field(default=1.0)
+    control_net_guidance_start: float = field(default=0.0)
+    control_net_guidance_end: float = field(default=1.0)
+
+
+@dataclass
+class SweepParameters(_Base):
+    # Comma separated values and start-end:step ranges, empty for random seeds or the CFG scale of the parameters
+    sweep_seeds: str = field(default="")
+    sweep_cfg_scales: str = field(default="")
+    sweep_max_batch: int = field(default=8)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,19 @@
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+_timings: List[Tuple[str, float]] = []
+
+
+@contextmanager
+def timed(name: str):
+    """Records how long a step of loading the plugin took, for the startup report"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings.append((name, time.perf_counter() - started))
+
+
+def report() -> str:
+    return "\n".join(f"{name}: {duration * 1000:.1f} ms" for name, duration in _timings) or "Nothing measured"
@@ -0,0 +1,109 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from logging.handlers import RotatingFileHandler
+from typing import Deque, Dict
+
+
+@dataclass()
+class SpanStats:
+    count: int
+    p50: float
+    p90: float
+    p99: float
+
+
+class _NullSpan:
+    """Shared span handed out while tracing is disabled, so a disabled span costs a call and an attribute lookup"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("_tracer", "name", "attributes", "_started")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: dict) -> None:
+        self._tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, kind, error, _):
+        self._tracer.record(self.name, time.perf_counter() - self._started, self.attributes, error)
+        return False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class Tracer:
+    """Times spans of the generation pipeline into rolling statistics and a rotating JSON lines file"""
+
+    def __init__(self, window: int = 512) -> None:
+        super().__init__()
+        self.enabled = False
+        self._window = window
+        self._lock = threading.Lock()
+        self._durations: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self._window))
+        self._logger = logging.getLogger("arcane_illusion.trace")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+
+    def enable(self, path: str = None, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 3):
+        for handler in list(self._logger.handlers):
+            self._logger.removeHandler(handler)
+            handler.close()
+        if path:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, attributes)
+
+    def record(self, name: str, duration: float, attributes: dict = None, error: BaseException = None):
+        with self._lock:
+            self._durations[name].append(duration)
+        if self._logger.handlers:
+            event = {"name": name, "time": time.time(), "duration_ms": round(duration * 1000, 3),
+                     "thread": threading.current_thread().name, **(attributes or {})}
+            if error is not None:
+                event["error"] = repr(error)
+            self._logger.info(json.dumps(event, default=str))
+
+    def stats(self) -> Dict[str, SpanStats]:
+        with self._lock:
+            snapshot = {name: sorted(durations) for name, durations in self._durations.items() if durations}
+        return {name: SpanStats(len(durations), *(durations[min(len(durations) - 1, int(p * len(durations)))]
+                                                  for p in (0.5, 0.9, 0.99)))
+                for name, durations in snapshot.items()}
+
+
+tracer = Tracer()
+
+
+def span(name: str, **attributes):
+    """Context manager timing a span of the generation pipeline, a no-op while tracing is disabled"""
+    return tracer.span(name, **attributes)
@@ -0,0 +1,122 @@
+"""Benchmark of the plugin's own overhead in the generation hot path.
+
+Drives the request body, the connection pool, the response stream and the image ingest path the way Client does,
+against a local stub backend and without Krita, and reports per stage latency percentiles, throughput and peak RSS.
+The body is serialized up front so that its cost is measured apart from the request. Layer creation needs a running
+Krita and is not covered.
+
+Run from the repository root with `python -m benchmarks.bench_generation --size 1024 --count 4 --iterations 20`.
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from arcane_illusion.image_generation.connection_pool import ConnectionPool
+from arcane_illusion.image_generation.request_body import RequestBody
+from arcane_illusion.image_generation.streaming import GenerationStream
+from benchmarks.stub_server import StubBackend
+
+try:
+    from arcane_illusion.image_generation.image_ingest import PixelFormat, ingest
+except ImportError:
+    PixelFormat, ingest = (None, None)
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+STAGES = ("serialize", "request", "parse", "ingest", "total")
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def peak_rss_mib() -> float:
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in KiB elsewhere
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_generation(pool: ConnectionPool, url: str, data: dict, pixel_format, timings: Dict[str, List[float]],
+                   lock: threading.Lock):
+    started = time.perf_counter()
+    body = b"".join(RequestBody(data))
+    serialized = time.perf_counter()
+    samples = defaultdict(list)
+    samples["serialize"].append(serialized - started)
+    images = 0
+    with pool.urlopen(url, "POST", body, {"Content-Type": "application/json"}) as response:
+        samples["request"].append(time.perf_counter() - serialized)
+        stream = GenerationStream(response)
+        iterator = iter(stream)
+        while True:
+            before = time.perf_counter()
+            image = next(iterator, None)
+            if image is None:
+                break
+            samples["parse"].append(time.perf_counter() - before)
+            if ingest:
+                before = time.perf_counter()
+                ingest(image, pixel_format)
+                samples["ingest"].append(time.perf_counter() - before)
+            images += 1
+        response.read()
+    samples["total"].append(time.perf_counter() - started)
+    with lock:
+        for stage, values in samples.items():
+            timings[stage].extend(values)
+    return images
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=512, help="width and height of the canned images")
+    parser.add_argument("--count", type=int, default=1, help="images per response")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated backend latency in seconds")
+    parser.add_argument("--iterations", type=int, default=20, help="generations per worker")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent workers")
+    args = parser.parse_args(argv)
+
+    stub = StubBackend(args.size, args.count, args.latency).start()
+    pool = ConnectionPool(max_per_host=args.concurrency)
+    url = f"{stub.url}/sdapi/v1/txt2img"
+    pixel_format = PixelFormat("RGBA", "U8", "sRGB-elle-V2-srgbtrc.icc") if PixelFormat else None
+    data = {"prompt": "benchmark", "seed": 1, "width": args.size, "height": args.size}
+    timings: Dict[str, List[float]] = defaultdict(list)
+    lock = threading.Lock()
+    totals = []
+
+    def worker():
+        totals.append(sum(run_generation(pool, url, data, pixel_format, timings, lock) for _ in range(args.iterations)))
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stub.stop()
+
+    print(f"{args.concurrency} x {args.iterations} generations of {args.count} {args.size}x{args.size} images")
+    print(f"{'stage':<10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage in STAGES:
+        values = timings.get(stage)
+        if not values:
+            print(f"{stage:<10}{'skipped':>10}")
+            continue
+        print(f"{stage:<10}" + "".join(f"{percentile(values, p) * 1000:>10.2f}" for p in (50, 90, 99, 100)))
+    print(f"throughput {sum(totals) / elapsed:.1f} images/s, pool {pool.stats()}")
+    print(f"peak RSS {peak_rss_mib():.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Stub of the Stable Diffusion WebUI API serving canned images.
+
+Run standalone with `python -m benchmarks.stub_server --port 7860 --size 512 --count 1 --latency 0.5`.
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import struct
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_png(width: int, height: int) -> bytes:
+    """Encodes an RGBA PNG of noise, which compresses about as badly as a generated picture"""
+    row_size = width * 4
+    noise = os.urandom(row_size * min(height, 64))
+    rows = b"".join(b"\0" + noise[(y % 64) * row_size:(y % 64 + 1) * row_size] for y in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows, 1)) + chunk(b"IEND", b"")
+
+
+class StubBackend:
+    def __init__(self, size: int = 512, count: int = 1, latency: float = 0.0, models=("stub-model",),
+                 host: str = "127.0.0.1", port: int = 0, accept_gzip: bool = True, error_status: int = 0) -> None:
+        super().__init__()
+        # Status answered to every generation instead of images, e.g. 422 for a rejected parameter
+        self.error_status = error_status
+        self.accept_gzip = accept_gzip
+        # Bytes of request bodies as sent over the wire
+        self.received = 0
+        self.size = size
+        self.count = count
+        self.latency = latency
+        self.interrupts = 0
+        self._interrupted = threading.Event()
+        self.models = list(models)
+        self.requests = 0
+        image = base64.b64encode(make_png(size, size)).decode("ascii")
+        self._images = [image] * count
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubBackend":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/sdapi/v1/sd-models":
+                    self._send([{"model_name": model, "hash": f"{index:08x}"} for index, model in enumerate(backend.models)])
+                elif path == "/sdapi/v1/samplers":
+                    self._send([{"name": "Euler a"}, {"name": "DPM++ 2M Karras"}])
+                elif path == "/sdapi/v1/progress":
+                    self._send({"progress": 0.5, "eta_relative": 1.0, "state": {}, "current_image": None})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                body = self._read_body()
+                if self.headers.get("Content-Encoding") == "gzip" and backend.accept_gzip:
+                    body = gzip.decompress(body)
+                try:
+                    data = json.loads(body or b"{}")
+                except ValueError:
+                    # What FastAPI answers when the body is not JSON, e.g. gzip it does not decode
+                    self._send({"detail": [{"type": "json_invalid", "loc": ["body", 0], "msg": "JSON decode error"}]},
+                               422)
+                    return
+                path = self.path.split("?")[0]
+                if path == "/sdapi/v1/interrupt":
+                    backend.interrupts += 1
+                    backend._interrupted.set()
+                    self._send({})
+                    return
+                if path not in ("/sdapi/v1/txt2img", "/sdapi/v1/img2img"):
+                    self.send_error(404)
+                    return
+                backend.requests += 1
+                if backend.error_status:
+                    self.send_error(backend.error_status)
+                    return
+                if backend._interrupted.wait(backend.latency):
+                    backend._interrupted.clear()
+                self._send({"images": backend._images, "parameters": data, "info": "{}"})
+
+            def _read_body(self) -> bytes:
+                if self.headers.get("Transfer-Encoding") != "chunked":
+                    body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                else:
+                    chunks = []
+                    while True:
+                        size = int(self.rfile.readline().split(b";")[0], 16)
+                        if not size:
+                            self.rfile.readline()
+                            break
+                        chunks.append(self.rfile.read(size))
+                        self.rfile.readline()
+                    body = b"".join(chunks)
+                backend.received += len(body)
+                return body
+
+            def _send(self, response, status: int = 200):
+                body = json.dumps(response).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=7860)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    stub = StubBackend(args.size, args.count, args.latency, port=args.port)
+    print(f"Serving on {stub.url}")
+    stub._server.serve_forever()
@@ -0,0 +1,40 @@
+from urllib.error import HTTPError
+
+import pytest
+
+from arcane_illusion.image_generation.client import Client
+from arcane_illusion.image_generation.connection_pool import ConnectionPool
+from benchmarks.stub_server import StubBackend
+
+_IMAGE = "A" * (1 << 17)
+
+
+def _generate_twice(backend: StubBackend):
+    client = Client(backend.url, ConnectionPool(), (5, 5), compress=True)
+    for _ in range(2):
+        client.generate({"prompt": "", "init_images": [_IMAGE]}, "img2img")
+
+
+def test_backend_without_gzip_gets_uncompressed_bodies():
+    backend = StubBackend(size=8, accept_gzip=False).start()
+    try:
+        _generate_twice(backend)
+    finally:
+        backend.stop()
+
+    assert backend.requests == 2
+
+
+def test_rejected_parameter_is_not_sent_again_uncompressed():
+    backend = StubBackend(size=8, error_status=422).start()
+    try:
+        client = Client(backend.url, ConnectionPool(), (5, 5), compress=True)
+        for _ in range(2):
+            with pytest.raises(HTTPError):
+                client.generate({"prompt": "", "sampler": "unknown", "init_images": [_IMAGE]}, "img2img")
+    finally:
+        backend.stop()
+
+    assert backend.requests == 2
+    # Both attempts went out compressed, neither was repeated uncompressed
+    assert backend.received < len(_IMAGE)
@@ -0,0 +1,67 @@
+import threading
+import time
+from urllib.error import HTTPError
+
+import pytest
+
+from arcane_illusion.image_generation.connection_pool import ConnectionPool
+from arcane_illusion.image_generation.dispatcher import Dispatcher
+from benchmarks.stub_server import StubBackend
+
+
+@pytest.fixture
+def rejecting_backends():
+    backends = [StubBackend(size=8, error_status=422).start() for _ in range(2)]
+    yield backends
+    for backend in backends:
+        backend.stop()
+
+
+def test_error_status_is_neither_retried_nor_counted_against_the_backend(rejecting_backends):
+    dispatcher = Dispatcher([backend.url for backend in rejecting_backends], pool=ConnectionPool(), timeout=(5, 5))
+
+    for _ in range(2):
+        with pytest.raises(HTTPError) as error:
+            dispatcher.generate({"prompt": "", "sampler": "unknown"})
+        assert error.value.code == 422
+
+    assert sum(backend.requests for backend in rejecting_backends) == 2
+    assert all(backend.healthy for backend in dispatcher.backends)
+    assert not dispatcher.busy_backends()
+
+
+def test_unreachable_backend_fails_over(rejecting_backends):
+    backend = StubBackend(size=8).start()
+    url = backend.url
+    backend.stop()
+    dispatcher = Dispatcher([url, rejecting_backends[0].url], pool=ConnectionPool(), timeout=(5, 5))
+    dispatcher.backends[1].latency = 1.0
+
+    with pytest.raises(HTTPError):
+        dispatcher.generate({"prompt": ""})
+
+    assert not dispatcher.backends[0].healthy
+    assert dispatcher.backends[1].healthy
+
+
+def test_generations_wait_for_the_only_backend_serving_the_model():
+    backends = [StubBackend(size=8, latency=0.3).start() for _ in range(2)]
+    try:
+        dispatcher = Dispatcher([backend.url for backend in backends], max_outstanding=1, pool=ConnectionPool(),
+                                timeout=(5, 5))
+        dispatcher.backends[0].models = {"model": "hash"}
+        dispatcher.backends[1].models = {}
+        started = time.monotonic()
+        threads = [threading.Thread(target=dispatcher.generate, args=({"prompt": "", "sd_model": "model"},))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+    finally:
+        for backend in backends:
+            backend.stop()
+
+    assert [backend.requests for backend in backends] == [2, 0]
+    assert elapsed >= 0.6
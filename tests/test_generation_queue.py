@@ -0,0 +1,20 @@
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from arcane_illusion.image_generation.generation_queue import seed_range  # noqa: E402
+
+
+def _seeds(data: dict) -> range:
+    return range(data["seed"], data["seed"] + data["batch_size"] * data["n_iter"])
+
+
+def test_seeds_of_batches_do_not_overlap():
+    jobs = seed_range({"seed": 100, "batch_size": 3, "n_iter": 2}, 4)
+
+    seeds = [seed for job in jobs for seed in _seeds(job)]
+    assert seeds == list(range(100, 124))
+
+
+def test_random_seed_stays_random():
+    assert [job["seed"] for job in seed_range({"seed": -1, "batch_size": 4, "n_iter": 1}, 3)] == [-1, -1, -1]
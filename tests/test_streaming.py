@@ -0,0 +1,22 @@
+import base64
+import io
+import json
+
+from arcane_illusion.image_generation.streaming import GenerationStream
+
+
+def test_echoed_parameters_are_skipped_and_parsed():
+    control_image = 'A"\\/\\' * (1 << 19)
+    image = bytes(range(256)) * 64
+    body = json.dumps({
+        "parameters": {"prompt": "cat", "controlnet": [{"input_image": control_image, "weight": 0.5}]},
+        "images": [base64.b64encode(image).decode()],
+        "info": "{\"seed\": 7}",
+    }).encode()
+
+    stream = GenerationStream(io.BytesIO(body), chunk_size=4096)
+    images = list(stream)
+
+    assert images == [image]
+    assert stream.parameters["controlnet"] == [{"input_image": control_image, "weight": 0.5}]
+    assert stream.info == "{\"seed\": 7}"
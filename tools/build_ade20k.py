@@ -0,0 +1,218 @@
+"""Builds the ADE20K class resource loaded by the segmentation palette.
+
+Packs the colors, names, synonyms and "stuff" flags below into `arcane_illusion/segmentation_palette/ade20k.bin`,
+see `ClassTable` for the layout. Run from the repository root with `python -m tools.build_ade20k` after editing them.
+"""
+import argparse
+import os
+import struct
+
+# Name with `;`-separated synonyms, red, green, blue, and whether the class is "stuff" rather than a countable thing
+# Reference: https://github.com/CSAILVision/semantic-segmentation-pytorch
+# Source: https://docs.google.com/spreadsheets/d/1se8YEtb2detS7OuPE86fXGyD269pMycAWe2mtKUj2W8/edit#gid=0
+SOURCE = [
+    ("wall", 120, 120, 120, True),
+    ("building;edifice", 180, 120, 120, True),
+    ("sky", 6, 230, 230, True),
+    ("floor;flooring", 80, 50, 50, True),
+    ("tree", 4, 200, 3, False),
+    ("ceiling", 120, 120, 80, True),
+    ("road;route", 140, 140, 140, True),
+    ("bed", 204, 5, 255, False),
+    ("windowpane;window", 230, 230, 230, False),
+    ("grass", 4, 250, 7, True),
+    ("cabinet", 224, 5, 255, False),
+    ("sidewalk;pavement", 235, 255, 7, True),
+    ("person;individual;someone;somebody;mortal;soul", 150, 5, 61, False),
+    ("earth;ground", 120, 120, 70, True),
+    ("door;double;door", 8, 255, 51, False),
+    ("table", 255, 6, 82, False),
+    ("mountain;mount", 143, 255, 140, True),
+    ("plant;flora;plant;life", 204, 255, 4, False),
+    ("curtain;drape;drapery;mantle;pall", 255, 51, 7, False),
+    ("chair", 204, 70, 3, False),
+    ("car;auto;automobile;machine;motorcar", 0, 102, 200, False),
+    ("water", 61, 230, 250, True),
+    ("painting;picture", 255, 6, 51, False),
+    ("sofa;couch;lounge", 11, 102, 255, False),
+    ("shelf", 255, 7, 71, False),
+    ("house", 255, 9, 224, True),
+    ("sea", 9, 7, 230, True),
+    ("mirror", 220, 220, 220, False),
+    ("rug;carpet;carpeting", 255, 9, 92, True),
+    ("field", 112, 9, 255, True),
+    ("armchair", 8, 255, 214, False),
+    ("seat", 7, 255, 224, False),
+    ("fence;fencing", 255, 184, 6, False),
+    ("desk", 10, 255, 71, False),
+    ("rock;stone", 255, 41, 10, False),
+    ("wardrobe;closet;press", 7, 255, 255, False),
+    ("lamp", 224, 255, 8, False),
+    ("bathtub;bathing;tub;bath;tub", 102, 8, 255, False),
+    ("railing;rail", 255, 61, 6, False),
+    ("cushion", 255, 194, 7, False),
+    ("base;pedestal;stand", 255, 122, 8, False),
+    ("box", 0, 255, 20, False),
+    ("column;pillar", 255, 8, 41, False),
+    ("signboard;sign", 255, 5, 153, False),
+    ("chest;of;drawers;chest;bureau;dresser", 6, 51, 255, False),
+    ("counter", 235, 12, 255, False),
+    ("sand", 160, 150, 20, True),
+    ("sink", 0, 163, 255, False),
+    ("skyscraper", 140, 140, 140, True),
+    ("fireplace;hearth;open;fireplace", 250, 10, 15, False),
+    ("refrigerator;icebox", 20, 255, 0, False),
+    ("grandstand;covered;stand", 31, 255, 0, True),
+    ("path", 255, 31, 0, True),
+    ("stairs;steps", 255, 224, 0, False),
+    ("runway", 153, 255, 0, True),
+    ("case;display;case;showcase;vitrine", 0, 0, 255, False),
+    ("pool;table;billiard;table;snooker;table", 255, 71, 0, False),
+    ("pillow", 0, 235, 255, False),
+    ("screen;door;screen", 0, 173, 255, False),
+    ("stairway;staircase", 31, 0, 255, True),
+    ("river", 11, 200, 200, True),
+    ("bridge;span", 255, 82, 0, True),
+    ("bookcase", 0, 255, 245, False),
+    ("blind;screen", 0, 61, 255, False),
+    ("coffee;table;cocktail;table", 0, 255, 112, False),
+    ("toilet;can;commode;crapper;pot;potty;stool;throne", 0, 255, 133, False),
+    ("flower", 255, 0, 0, False),
+    ("book", 255, 163, 0, False),
+    ("hill", 255, 102, 0, True),
+    ("bench", 194, 255, 0, False),
+    ("countertop", 0, 143, 255, False),
+    ("stove;kitchen;stove;range;kitchen;range;cooking;stove", 51, 255, 0, False),
+    ("palm;palm;tree", 0, 82, 255, False),
+    ("kitchen;island", 0, 255, 41, False),
+    (
+        "computer;computing;machine;computing;device;data;processor;electronic;computer;information;processing;system",
+        0, 255, 173, False),
+    ("swivel;chair", 10, 0, 255, False),
+    ("boat", 173, 255, 0, False),
+    ("bar", 0, 255, 153, False),
+    ("arcade;machine", 255, 92, 0, False),
+    ("hovel;hut;hutch;shack;shanty", 255, 0, 255, True),
+    ("bus;autobus;coach;charabanc;double-decker;jitney;motorbus;motorcoach;omnibus;passenger;vehicle", 255, 0, 245,
+     False),
+    ("towel", 255, 0, 102, False),
+    ("light;light;source", 255, 173, 0, False),
+    ("truck;motortruck", 255, 0, 20, False),
+    ("tower", 255, 184, 184, True),
+    ("chandelier;pendant;pendent", 0, 31, 255, False),
+    ("awning;sunshade;sunblind", 0, 255, 61, False),
+    ("streetlight;street;lamp", 0, 71, 255, False),
+    ("booth;cubicle;stall;kiosk", 255, 0, 204, False),
+    ("television;television;receiver;television;set;tv;tv;set;idiot;box;boob;tube;telly;goggle;box", 0, 255, 194,
+     False),
+    ("airplane;aeroplane;plane", 0, 255, 82, False),
+    ("dirt;track", 0, 10, 255, True),
+    ("apparel;wearing;apparel;dress;clothes", 0, 112, 255, False),
+    ("pole", 51, 0, 255, False),
+    ("land;ground;soil", 0, 194, 255, True),
+    ("bannister;banister;balustrade;balusters;handrail", 0, 122, 255, False),
+    ("escalator;moving;staircase;moving;stairway", 0, 255, 163, True),
+    ("ottoman;pouf;pouffe;puff;hassock", 255, 153, 0, False),
+    ("bottle", 0, 255, 10, False),
+    ("buffet;counter;sideboard", 255, 112, 0, False),
+    ("poster;posting;placard;notice;bill;card", 143, 255, 0, False),
+    ("stage", 82, 0, 255, True),
+    ("van", 163, 255, 0, False),
+    ("ship", 255, 235, 0, False),
+    ("fountain", 8, 184, 170, False),
+    ("conveyer;belt;conveyor;belt;conveyer;conveyor;transporter", 133, 0, 255, True),
+    ("canopy", 0, 255, 92, False),
+    ("washer;automatic;washer;washing;machine", 184, 0, 255, False),
+    ("plaything;toy", 255, 0, 31, False),
+    ("swimming;pool;swimming;bath;natatorium", 0, 184, 255, True),
+    ("stool", 0, 214, 255, False),
+    ("barrel;cask", 255, 0, 112, False),
+    ("basket;handbasket", 92, 255, 0, False),
+    ("waterfall;falls", 0, 224, 255, True),
+    ("tent;collapsible;shelter", 112, 224, 255, False),
+    ("bag", 70, 184, 160, False),
+    ("minibike;motorbike", 163, 0, 255, False),
+    ("cradle", 153, 0, 255, False),
+    ("oven", 71, 255, 0, False),
+    ("ball", 255, 0, 163, False),
+    ("food;solid;food", 255, 204, 0, False),
+    ("step;stair", 255, 0, 143, False),
+    ("tank;storage;tank", 0, 255, 235, False),
+    ("trade;name;brand;name;brand;marque", 133, 255, 0, False),
+    ("microwave;microwave;oven", 255, 0, 235, False),
+    ("pot;flowerpot", 245, 0, 255, False),
+    ("animal;animate;being;beast;brute;creature;fauna", 255, 0, 122, False),
+    ("bicycle;bike;wheel;cycle", 255, 245, 0, False),
+    ("lake", 10, 190, 212, True),
+    ("dishwasher;dish;washer;dishwashing;machine", 214, 255, 0, False),
+    ("screen;silver;screen;projection;screen", 0, 204, 255, False),
+    ("blanket;cover", 20, 0, 255, False),
+    ("sculpture", 255, 255, 0, False),
+    ("hood;exhaust;hood", 0, 153, 255, False),
+    ("sconce", 0, 41, 255, False),
+    ("vase", 0, 255, 204, False),
+    ("traffic;light;traffic;signal;stoplight", 41, 0, 255, False),
+    ("tray", 41, 255, 0, False),
+    ("ashcan;trash;can;garbage;can;wastebin;ash;bin;ash-bin;ashbin;dustbin;trash;barrel;trash;bin", 173, 0, 255,
+     False),
+    ("fan", 0, 245, 255, False),
+    ("pier;wharf;wharfage;dock", 71, 0, 255, True),
+    ("crt;screen", 122, 0, 255, False),
+    ("plate", 0, 255, 184, False),
+    ("monitor;monitoring;device", 0, 92, 255, False),
+    ("bulletin;board;notice;board", 184, 255, 0, False),
+    ("shower", 0, 133, 255, False),
+    ("radiator", 255, 214, 0, False),
+    ("glass;drinking;glass", 25, 194, 194, False),
+    ("clock", 102, 255, 0, False),
+    ("flag", 92, 0, 255, False),
+]
+
+MAGIC = b"ADE\x01"
+# Magic, class count, synonym count, then the offsets of the sections and of the end of the file
+HEADER = struct.Struct("<4sHH8I")
+
+
+def _string_table(strings):
+    blobs = [string.encode("utf-8") for string in strings]
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    return struct.pack(f"<{len(offsets)}I", *offsets), b"".join(blobs)
+
+
+def build(source=SOURCE) -> bytes:
+    count = len(source)
+    rgb = bytes(value for _, r, g, b, _ in source for value in (r, g, b))
+    stuff = bytearray((count + 7) // 8)
+    for i, (*_, is_stuff) in enumerate(source):
+        if is_stuff:
+            stuff[i // 8] |= 1 << (i % 8)
+    name_offsets, names = _string_table(name for name, *_ in source)
+    synonyms = [synonym for name, *_ in source for synonym in name.split(";")]
+    starts = [0]
+    for name, *_ in source:
+        starts.append(starts[-1] + len(name.split(";")))
+    synonym_starts = struct.pack(f"<{len(starts)}H", *starts)
+    synonym_offsets, synonym_names = _string_table(synonyms)
+
+    sections = [rgb, bytes(stuff), name_offsets, names, synonym_starts, synonym_offsets, synonym_names]
+    offsets = []
+    data = bytearray(HEADER.size)
+    for section in sections:
+        # Sections start on 4 byte boundaries so the offset tables can be cast to 32-bit integers in place
+        data += bytes(-len(data) % 4)
+        offsets.append(len(data))
+        data += section
+    HEADER.pack_into(data, 0, MAGIC, count, len(synonyms), *offsets, len(data))
+    return bytes(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default=os.path.join("arcane_illusion", "segmentation_palette", "ade20k.bin"))
+    args = parser.parse_args()
+    data = build()
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(f"{len(SOURCE)} classes, {len(data)} bytes written to {args.output}")